@@ -0,0 +1,289 @@
+"""Throughput and latency benchmark for every API route.
+
+Seeds a synthetic question bank of --size questions into --database, then drives each route either
+in-process through the Flask test client (--mode client) or over real HTTP with a multi-threaded load
+generator (--mode http, against an in-process threaded server, or --url for an already running one).
+Reports p50/p99 latency, requests per second and SQL queries per request.
+
+    python -m benchmarks.api_benchmark --size 100000 --save benchmarks/baselines/sqlite-100k.json
+    python -m benchmarks.api_benchmark --size 100000 --compare benchmarks/baselines/sqlite-100k.json
+
+The database is emptied and seeded afresh on every run (--reuse-database keeps it). Each route gets
+--warmup untimed requests, then --repeat timed runs of --requests requests; the figures reported are the
+medians of the runs, and errors the worst run.
+
+--compare exits with status 1 when the run's settings (size, mode, concurrency, requests) differ from the
+baseline's, when a route returns more errors than in the baseline, when its p99 in the fastest run exceeds
+the p99 of the slowest baseline run by more than both --tolerance and --min-delta-ms (p50 below
+MIN_P99_SAMPLES requests per run, where p99 is little more than the slowest request), or when it issues
+noticeably more SQL queries per request than the baseline did (half a query of slack).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+from threading import Lock, Thread, local
+
+MIN_P99_SAMPLES = 100
+
+ROUTES = (
+    "GET /categories",
+    "GET /questions",
+    "GET /questions (after_id)",
+    "GET /categories/<id>/questions",
+    "POST /search",
+    "POST /quizzes",
+    "POST /questions",
+    "DELETE /questions/<id>",
+)
+
+
+class Scenario:
+    """Builds the (method, path, json body) of each request for one benchmark run."""
+
+    def __init__(self, question_ids, words, category_count, deletes=None):
+        self.question_ids = question_ids
+        self.words = words
+        self.category_count = category_count
+        # Enough existing questions for every DELETE of the run (up to half the bank), so each one deletes a row
+        deletes = min(len(question_ids) // 2, deletes if deletes is not None else len(question_ids) // 10)
+        self._deletable_ids = list(question_ids[len(question_ids) - deletes:])
+        self._lock = Lock()
+
+    def request(self, route):
+        if route == "GET /categories":
+            return "GET", "/categories", None
+        if route == "GET /questions":
+            return "GET", "/questions?page={}".format(random.randint(1, min(50, len(self.question_ids) // 10))), None
+        if route == "GET /questions (after_id)":
+            return "GET", "/questions?after_id={}".format(random.choice(self.question_ids)), None
+        if route == "GET /categories/<id>/questions":
+            return "GET", "/categories/{}/questions".format(random.randint(1, self.category_count)), None
+        if route == "POST /search":
+            return "POST", "/search", {"searchTerm": random.choice(self.words)}
+        if route == "POST /quizzes":
+            return "POST", "/quizzes", {"previous_questions": random.sample(self.question_ids, 5),
+                                        "quiz_category": {"id": random.randint(0, self.category_count)}}
+        if route == "POST /questions":
+            return "POST", "/questions", {"question": "Benchmark question?", "answer": "Benchmark answer",
+                                          "category": random.randint(1, self.category_count), "difficulty": 1}
+        if route == "DELETE /questions/<id>":
+            with self._lock:
+                question_id = self._deletable_ids.pop() if self._deletable_ids else 0
+            return "DELETE", "/questions/{}".format(question_id), None
+
+        raise ValueError(route)
+
+
+def client_sender(app):
+    clients = local()
+
+    def send(method, path, body):
+        if not hasattr(clients, "client"):
+            clients.client = app.test_client()
+        return clients.client.open(path, method=method, json=body).status_code
+
+    return send
+
+
+def http_sender(base_url):
+    def send(method, path, body):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(base_url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    return send
+
+
+def run_route(route, scenario, send, requests, concurrency, query_counter, warmup=0):
+    from .common import percentiles
+
+    def one_request(_):
+        method, path, body = scenario.request(route)
+        started = time.perf_counter()
+        status = send(method, path, body)
+        return time.perf_counter() - started, status
+
+    # Untimed: fills caches and connection pools so the first timed requests do not pay for it
+    if warmup:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(one_request, range(warmup)))
+
+    queries_before = query_counter.count if query_counter is not None else 0
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one_request, range(requests)))
+
+    elapsed = time.perf_counter() - started
+    summary = percentiles([latency for latency, _ in results])
+    summary.update({
+        "rps": round(requests / elapsed, 1),
+        "errors": sum(1 for _, status in results if status >= 400),
+        "queries_per_request": (round((query_counter.count - queries_before) / requests, 2)
+                                if query_counter is not None else None),
+    })
+
+    return summary
+
+
+#  Helper function to combine repeated runs of one route: medians of the timings (each run's p50 and p99
+#  kept too, for --compare), the worst error count.
+def combine_runs(summaries):
+    combined = {}
+
+    for name in ("p50_ms", "p99_ms"):
+        combined[name + "_runs"] = [summary[name] for summary in summaries]
+        combined[name] = round(median(combined[name + "_runs"]), 3)
+
+    combined["rps"] = round(median(summary["rps"] for summary in summaries), 1)
+    combined["errors"] = max(summary["errors"] for summary in summaries)
+    combined["queries_per_request"] = (round(median(summary["queries_per_request"] for summary in summaries), 2)
+                                       if summaries[0]["queries_per_request"] is not None else None)
+
+    return combined
+
+
+def compare(results, baseline, tolerance, min_delta_ms=0):
+    regressions = []
+
+    # Timings of runs made with other settings say nothing about a regression
+    for setting in ("size", "mode", "concurrency", "requests"):
+        if results.get(setting) != baseline.get(setting):
+            regressions.append("{} is {} but the baseline was recorded with {}".format(
+                setting, results.get(setting), baseline.get(setting)))
+
+    if regressions:
+        return regressions
+    # p99 of a few dozen requests is the slowest one, and too noisy to compare
+    samples = min(results.get("requests", 0), baseline.get("requests", 0))
+    percentile = "p99_ms" if samples >= MIN_P99_SAMPLES else "p50_ms"
+
+    for route, result in results["routes"].items():
+        base = baseline["routes"].get(route)
+        if base is None:
+            continue
+
+        if result["errors"] > base["errors"]:
+            regressions.append("{}: {} errors > baseline {}".format(route, result["errors"], base["errors"]))
+        # Only when every run is slower than every baseline run: single slow runs are machine noise
+        fastest = min(result.get(percentile + "_runs", [result[percentile]]))
+        slowest_base = max(base.get(percentile + "_runs", [base[percentile]]))
+
+        if fastest > max(slowest_base * (1 + tolerance), slowest_base + min_delta_ms):
+            regressions.append("{}: {} {}ms in the fastest run > baseline {}ms in the slowest".format(
+                route, percentile[:3], fastest, slowest_base))
+        # Half a query of slack absorbs response cache hits landing differently between runs
+        if (result["queries_per_request"] is not None and base["queries_per_request"] is not None
+                and result["queries_per_request"] > base["queries_per_request"] + 0.5):
+            regressions.append("{}: {} queries/request > baseline {}".format(
+                route, result["queries_per_request"], base["queries_per_request"]))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="sqlite:////tmp/trivia_api_bench.sqlite",
+                        help="scratch database: its tables are dropped and recreated unless --reuse-database")
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--mode", choices=("client", "http"), default="client")
+    parser.add_argument("--url", help="benchmark an already running server instead of an in-process one")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per route and run")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per route before the runs")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--routes", nargs="*", default=ROUTES, choices=ROUTES, metavar="ROUTE")
+    parser.add_argument("--no-response-cache", action="store_true")
+    parser.add_argument("--reuse-database", action="store_true",
+                        help="top up the existing questions instead of starting from an empty database")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="fail on regressions against this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p99 (or p50) growth")
+    parser.add_argument("--min-delta-ms", type=float, default=10,
+                        help="growth in milliseconds below which a p99 (or p50) change is treated as noise")
+    args = parser.parse_args()
+
+    # flaskr reads DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = args.database
+    from flaskr import create_app
+    from flaskr.models import db, Question, Category
+    from .common import QueryCounter, WORDS, seed
+
+    # The load generator is a single client: per-client rate limits would turn the run into 429s
+    app = create_app({"RESPONSE_CACHE_ENABLED": not args.no_response_cache, "ADMISSION_CONTROL_ENABLED": False})
+
+    with app.app_context():
+        # Earlier runs' POSTs and DELETEs would otherwise change the data every run starts from
+        if not args.reuse_database:
+            db.drop_all()
+            db.create_all()
+        seed(args.size)
+        question_ids = [question_id for question_id, in db.session.query(Question.id).order_by(Question.id)]
+        category_count = db.session.query(Category.id).count()
+
+    scenario = Scenario(question_ids, WORDS, category_count, args.warmup + max(1, args.repeat) * args.requests)
+
+    if args.url:
+        send = http_sender(args.url.rstrip("/"))
+    elif args.mode == "http":
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietRequestHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        send = http_sender("http://127.0.0.1:{}".format(server.server_port))
+    else:
+        send = client_sender(app)
+
+    results = {"size": len(question_ids), "mode": "http" if args.url else args.mode,
+               "concurrency": args.concurrency, "requests": args.requests, "repeat": args.repeat, "routes": {}}
+
+    with QueryCounter() as query_counter:
+        print("{:<32} {:>10} {:>10} {:>10} {:>12} {:>7}".format("route", "p50 ms", "p99 ms", "req/s", "queries/req",
+                                                               "errors"))
+        for route in args.routes:
+            summary = combine_runs([
+                run_route(route, scenario, send, args.requests, args.concurrency, None if args.url else query_counter,
+                          args.warmup if run == 0 else 0)
+                for run in range(max(1, args.repeat))
+            ])
+            results["routes"][route] = summary
+            print("{:<32} {:>10} {:>10} {:>10} {:>12} {:>7}".format(
+                route, summary["p50_ms"], summary["p99_ms"], summary["rps"],
+                "-" if summary["queries_per_request"] is None else summary["queries_per_request"],
+                summary["errors"]))
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance, args.min_delta_ms)
+
+        for regression in regressions:
+            print("REGRESSION " + regression)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Shared helpers for the benchmarks: synthetic data seeding, SQL query counting and latency summaries."""
+import random
+from threading import Lock
+from statistics import median
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from flaskr.models import db, Question, Category
+
+CATEGORY_TYPES = ("Science", "Art", "Geography", "History", "Entertainment", "Sports")
+WORDS = ("afraid", "planet", "river", "movie", "oscar", "painter", "world", "cup", "element", "king",
+         "ocean", "desert", "capital", "novel", "author", "team", "goal", "science", "history", "art")
+
+
+#  Helper function to top the database up to `size` synthetic questions (and the six categories).
+def seed(size: int, batch_size: int = 5000):
+    if not db.session.query(Category.id).count():
+        db.session.execute(Category.__table__.insert(), [{"type": category_type} for category_type in CATEGORY_TYPES])
+        db.session.commit()
+
+    existing = db.session.query(Question.id).count()
+    rng = random.Random(42)
+
+    for start in range(existing, size, batch_size):
+        rows = [{
+            "question": " ".join(rng.choice(WORDS) for _ in range(8)) + " #{}?".format(i),
+            "answer": " ".join(rng.choice(WORDS) for _ in range(2)),
+            "category": rng.randint(1, len(CATEGORY_TYPES)),
+            "difficulty": rng.randint(1, 5),
+        } for i in range(start, min(start + batch_size, size))]
+        db.session.execute(Question.__table__.insert(), rows)
+        db.session.commit()
+
+
+'''
+QueryCounter
+    counts SQL statements executed by any engine in this process while active.
+'''
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self._lock = Lock()
+        self.count = 0
+
+    def _count(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(Engine, "after_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, "after_cursor_execute", self._count)
+
+
+#  Helper function to summarise latency samples (seconds) as p50/p99 in milliseconds.
+def percentiles(samples):
+    samples = sorted(samples)
+
+    return {
+        "p50_ms": round(median(samples) * 1000, 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3),
+    }
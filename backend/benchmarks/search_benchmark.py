@@ -0,0 +1,65 @@
+"""Compare the two search backends behind POST /search on the same query.
+
+Seeds a synthetic question bank into the given database (if it holds fewer rows than --size),
+then times search_questions() with SEARCH_BACKEND=database (ILIKE on question and answer text) and
+SEARCH_BACKEND=memory (the in-process trigram index) for a handful of search terms. Both sides
+answer the same request: the first page of --per-page ranked matches plus the total match count.
+
+    python -m benchmarks.search_benchmark --size 100000
+    python -m benchmarks.search_benchmark --database postgres://localhost:5432/trivia_bench
+
+On Postgres the database side is served by the trigram indexes of
+migrations/001_questions_search_index.sql: run it once before and once after applying the
+migration to see what the indexes buy. On SQLite the database side is always a full scan.
+"""
+import argparse
+import time
+
+from flask import Flask
+
+from flaskr.models import setup_db
+from flaskr.search import search_questions, trigram_index
+
+from .common import percentiles, seed
+
+TERMS = ("afraid", "capital", "oscar winner", "zz-no-match", "ri")
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+
+    summary = percentiles(samples)
+    return summary["p50_ms"], summary["p99_ms"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="sqlite:////tmp/trivia_bench.sqlite")
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--per-page", type=int, default=10)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    setup_db(app, args.database)
+
+    with app.app_context():
+        seed(args.size)
+        trigram_index.search("warm")  # build the in-process index outside the timed region
+
+        print("{:<14} {:>12} {:>12} {:>12} {:>12}".format("term", "database p50", "database p99", "memory p50",
+                                                           "memory p99"))
+        for term in TERMS:
+            database_p50, database_p99 = timed(lambda: search_questions(term, 1, args.per_page, "database"),
+                                               args.repeat)
+            memory_p50, memory_p99 = timed(lambda: search_questions(term, 1, args.per_page, "memory"), args.repeat)
+            print("{:<14} {:>10.2f}ms {:>10.2f}ms {:>10.2f}ms {:>10.2f}ms".format(
+                term, database_p50, database_p99, memory_p50, memory_p99))
+
+
+if __name__ == "__main__":
+    main()
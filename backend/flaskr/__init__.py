@@ -1,17 +1,46 @@
+from time import perf_counter
+
+# Cold-start clock: module imports are part of a worker's time to first request
+_import_started = perf_counter()
+
+import json
 import os
 import sys
 from math import ceil
-from random import choice
 from dotenv import load_dotenv
-from flask import Flask, request, abort, jsonify
+from flask import Flask, request, abort, jsonify, g, stream_with_context
 from flask_cors import CORS
-
-from .find_category_type import find_category_type
-from .models import setup_db, Question, Category, db
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from .admission import MAX_CONCURRENT_REQUESTS, RATE_LIMIT_BURST, RATE_LIMIT_PER_SECOND, ConcurrencyLimiter, \
+    SingleFlight, TokenBucketLimiter
+from .bulk import MAX_BATCH_IDS, delete_questions, export_questions, import_questions, is_question_id, \
+    read_question_rows, update_questions, validate_question_update
+from .category_registry import category_registry
+from .category_stats import category_difficulty_counts, rebuild_category_stats
+from .compression import COMPRESSIBLE_MIMETYPES, COMPRESSION_MIN_SIZE, MSGPACK_MIMETYPE, ResponseCompressor, \
+    msgpack_encoder
+from .db_pool import pool_metrics
+from .jobs import JOB_MAX_ATTEMPTS, JOB_QUEUE_MAX_SIZE, JOB_QUEUE_WORKERS, job_queue
+from .json_fragments import QuestionFragmentCache, make_json_encoder
+from .models import setup_db, Question, db
+from .pagination import MAX_QUESTIONS_PER_PAGE, QUESTIONS_PER_PAGE, get_after_id, get_per_page, question_count, \
+    questions_after, questions_page
+from .question_store import QUESTION_STORE_REFRESH_INTERVAL, QuestionStore
+from .quiz import DIFFICULTIES, category_key, next_adaptive_quiz_question, next_difficulty, next_quiz_question
+from .response_cache import RESPONSE_CACHE_MAX_AGE, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRY_AGE, \
+    ResponseCache, cache_key, data_version
+from .replica import READ_YOUR_WRITES_WINDOW, ReplicaRouter
+from .quiz_sessions import make_session_store, next_session_question, start_quiz_session
+from .search import search_question_rows, search_questions
+from .shared_version import SHARED_VERSION_POLL_INTERVAL, shared_version_poller
+from .streaming import question_rows, stream_questions_json
+from .suggest import MAX_SUGGESTIONS, SUGGESTIONS, prefix_index
+from .warmup import startup_times, warm_caches_in_background
 
 load_dotenv()
 
-QUESTIONS_PER_PAGE = 10
+startup_times.imports = perf_counter() - _import_started
 
 CODE = {
     # Success codes
@@ -22,6 +51,7 @@ CODE = {
     "404_RESOURCE_NOT_FOUND": 404,
     "405_METHOD_NOT_ALLOWED": 405,
     "422_UNPROCESSABLE_ENTITY": 422,
+    "429_TOO_MANY_REQUESTS": 429,
 
     # Server error codes
     "500_INTERNAL_SERVER_ERROR": 500
@@ -29,98 +59,435 @@ CODE = {
 
 
 def create_app(test_config=None):
+    create_app_started = perf_counter()
+
     # create and configure the app
     app = Flask(__name__)
     setup_db(app)
 
     app.config.from_mapping(
         SECRET_KEY=os.getenv('SECRET_KEY'),
-        DATABASE=os.path.join(app.instance_path, 'flaskr.sqlite')
+        DATABASE=os.path.join(app.instance_path, 'flaskr.sqlite'),
+        SEARCH_BACKEND=os.getenv('SEARCH_BACKEND', 'auto'),
+        QUIZ_SESSION_STORE=os.getenv('QUIZ_SESSION_STORE', 'memory'),
+        QUIZ_SESSION_REDIS_URL=os.getenv('QUIZ_SESSION_REDIS_URL', 'redis://localhost:6379/0'),
+        QUIZ_SESSION_TTL=int(os.getenv('QUIZ_SESSION_TTL', 60 * 60)),
+        QUIZ_SESSION_MAX=int(os.getenv('QUIZ_SESSION_MAX', 10000)),
+        RESPONSE_CACHE_ENABLED=os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true',
+        RESPONSE_CACHE_MAX_BYTES=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', RESPONSE_CACHE_MAX_BYTES)),
+        RESPONSE_CACHE_MAX_AGE=int(os.getenv('RESPONSE_CACHE_MAX_AGE', RESPONSE_CACHE_MAX_AGE)),
+        RESPONSE_CACHE_MAX_ENTRY_AGE=float(os.getenv('RESPONSE_CACHE_MAX_ENTRY_AGE', RESPONSE_CACHE_MAX_ENTRY_AGE)),
+        INSTRUMENTATION_ENABLED=os.getenv('INSTRUMENTATION_ENABLED', 'false').lower() == 'true',
+        PROFILE_SAMPLE_RATE=float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+        PROFILE_DIR=os.getenv('PROFILE_DIR', os.path.join(app.instance_path, 'profiles')),
+        QUESTION_STORE_ENABLED=os.getenv('QUESTION_STORE_ENABLED', 'false').lower() == 'true',
+        QUESTION_STORE_REFRESH_INTERVAL=int(os.getenv('QUESTION_STORE_REFRESH_INTERVAL',
+                                                      QUESTION_STORE_REFRESH_INTERVAL)),
+        JSON_FRAGMENT_CACHE_ENABLED=os.getenv('JSON_FRAGMENT_CACHE_ENABLED', 'true').lower() == 'true',
+        JSON_ENCODER=os.getenv('JSON_ENCODER', 'stdlib'),
+        CACHE_WARMUP_ENABLED=os.getenv('CACHE_WARMUP_ENABLED', 'false').lower() == 'true',
+        READ_YOUR_WRITES_WINDOW=float(os.getenv('READ_YOUR_WRITES_WINDOW', READ_YOUR_WRITES_WINDOW)),
+        ADMISSION_CONTROL_ENABLED=os.getenv('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true',
+        PROXY_FIX_X_FOR=int(os.getenv('PROXY_FIX_X_FOR', 0)),
+        RATE_LIMIT_PER_SECOND=float(os.getenv('RATE_LIMIT_PER_SECOND', RATE_LIMIT_PER_SECOND)),
+        RATE_LIMIT_BURST=int(os.getenv('RATE_LIMIT_BURST', RATE_LIMIT_BURST)),
+        MAX_CONCURRENT_REQUESTS=int(os.getenv('MAX_CONCURRENT_REQUESTS', MAX_CONCURRENT_REQUESTS)),
+        JOB_QUEUE_WORKERS=int(os.getenv('JOB_QUEUE_WORKERS', JOB_QUEUE_WORKERS)),
+        JOB_QUEUE_MAX_SIZE=int(os.getenv('JOB_QUEUE_MAX_SIZE', JOB_QUEUE_MAX_SIZE)),
+        JOB_MAX_ATTEMPTS=int(os.getenv('JOB_MAX_ATTEMPTS', JOB_MAX_ATTEMPTS)),
+        JOB_QUEUE_PERSISTENT=os.getenv('JOB_QUEUE_PERSISTENT', 'false').lower() == 'true',
+        COMPRESSION_ENABLED=os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true',
+        COMPRESSION_MIN_SIZE=int(os.getenv('COMPRESSION_MIN_SIZE', COMPRESSION_MIN_SIZE)),
+        MSGPACK_ENABLED=os.getenv('MSGPACK_ENABLED', 'true').lower() == 'true',
+        SHARED_VERSION_POLL_INTERVAL=float(os.getenv('SHARED_VERSION_POLL_INTERVAL', SHARED_VERSION_POLL_INTERVAL)),
+        # Compact JSON from jsonify (debug mode still indents it)
+        JSONIFY_PRETTYPRINT_REGULAR=False
     )
 
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+
+    # Behind N trusted proxies: take the client address (used by the rate limiter) from X-Forwarded-For
+    if app.config["PROXY_FIX_X_FOR"] > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_FIX_X_FOR"])
+
+    # Opt-in latency, SQL and serialization metrics (registered first so every other hook is timed)
+    if app.config["INSTRUMENTATION_ENABLED"]:
+        # Imported here so workers without instrumentation never load cProfile
+        from .instrumentation import init_instrumentation
+
+        init_instrumentation(app, db)
+
+    quiz_sessions = make_session_store(app.config)
+    response_cache = ResponseCache(app.config["RESPONSE_CACHE_MAX_BYTES"], app.config["RESPONSE_CACHE_MAX_ENTRY_AGE"])
+
+    # Read-replica mode: listing, category browsing and quiz reads come from an in-memory snapshot
+    question_store = (QuestionStore(app.config["QUESTION_STORE_REFRESH_INTERVAL"])
+                      if app.config["QUESTION_STORE_ENABLED"] else None)
+    load_question = question_store.get if question_store is not None else None
+
+    # Question lists are spliced together from pre-encoded per-question JSON
+    fragment_cache = (QuestionFragmentCache(make_json_encoder(app.config["JSON_ENCODER"]))
+                      if app.config["JSON_FRAGMENT_CACHE_ENABLED"] else None)
+
+    def questions_response(payload, questions):
+        if fragment_cache is None:
+            return jsonify({**payload, "questions": [question.format() for question in questions]})
+
+        return app.response_class(fragment_cache.render(payload, questions), mimetype=app.config["JSONIFY_MIMETYPE"])
+
+    # Read-heavy GET endpoints served through the response cache
+    cacheable_endpoints = {"get_categories", "get_category_stats", "get_questions", "get_questions_by_category"}
+
+    # Read-only endpoints read from the replica bind, when one is configured (DATABASE_REPLICA_URL)
+    replica_router = ReplicaRouter(app.config["READ_YOUR_WRITES_WINDOW"])
+    replica_read_endpoints = cacheable_endpoints | {"bulk_export_questions", "search_question",
+                                                    "get_random_quiz_question", "start_quiz", "suggest_search",
+                                                    "next_quiz_session_question"}
+    question_write_endpoints = {"post_question", "bulk_import_questions", "delete_question", "delete_many_questions",
+                                "update_many_questions"}
+
+    # Admission control for the endpoints that can scan the questions table
+    rate_limiter = TokenBucketLimiter(app.config["RATE_LIMIT_PER_SECOND"], app.config["RATE_LIMIT_BURST"])
+    concurrency_limiter = ConcurrencyLimiter(app.config["MAX_CONCURRENT_REQUESTS"])
+    admission_endpoints = {"search_question", "get_random_quiz_question"}
+    search_flights = SingleFlight()
+
+    # gzip/brotli by Accept-Encoding, MessagePack instead of JSON by Accept (when 'msgpack' is installed)
+    compressor = ResponseCompressor(app.config["COMPRESSION_MIN_SIZE"]) if app.config["COMPRESSION_ENABLED"] else None
+    encode_msgpack = msgpack_encoder() if app.config["MSGPACK_ENABLED"] else None
+    response_mimetypes = [app.config["JSONIFY_MIMETYPE"]] + ([MSGPACK_MIMETYPE] if encode_msgpack else [])
+    compression_flights = SingleFlight()
+
     CORS(app, resources={r"*": {"origins": "*"}})
 
+    # Per-client token bucket first, then shed load with 429 once MAX_CONCURRENT_REQUESTS are in flight
+    @app.before_request
+    def admit_request():
+        if not app.config["ADMISSION_CONTROL_ENABLED"] or request.endpoint not in admission_endpoints:
+            return None
+
+        g.retry_after = rate_limiter.acquire(request.remote_addr)
+
+        if g.retry_after:
+            abort(CODE["429_TOO_MANY_REQUESTS"])
+
+        if not concurrency_limiter.try_acquire():
+            g.retry_after = 1
+            abort(CODE["429_TOO_MANY_REQUESTS"])
+
+        g.holds_admission_slot = True
+
+    # Runs once the response (streamed ones included) is finished
+    @app.teardown_request
+    def release_admission_slot(exception):
+        if g.pop("holds_admission_slot", False):
+            concurrency_limiter.release()
+
+    # Writes made by other worker processes: drop this process's caches, then read them back from the
+    # primary for the read-your-writes window so they are not rebuilt from a lagging replica
+    @app.before_request
+    def sync_with_other_processes():
+        if shared_version_poller.poll(app.config["SHARED_VERSION_POLL_INTERVAL"]):
+            replica_router.record_write()
+
+    @app.before_request
+    def route_reads_to_replica():
+        g.read_from_replica = request.endpoint in replica_read_endpoints and replica_router.use_replica(request)
+
+    # Successful writes start the read-your-writes window for this process and for the client
+    @app.after_request
+    def record_write(response):
+        if request.endpoint in question_write_endpoints and response.status_code < CODE["400_BAD_REQUEST"]:
+            replica_router.record_write()
+            return replica_router.mark_response(response)
+
+        return response
+
     @app.after_request
     def after_request(response):
         response.headers.add("Access-Control-Allow-Headers", "Content-Type, Authorization")
         response.headers.add("Access-Control-Allow-Methods", "GET, POST, PATCH, DELETE, OPTIONS")
         return response
 
+    #  Helper function to pick the response format from the Accept header (JSON unless MessagePack is preferred).
+    def response_mimetype():
+        return request.accept_mimetypes.best_match(response_mimetypes, default=response_mimetypes[0])
+
+    # Runs after every other response hook, so it sees bodies converted to MessagePack and cached ones
+    @app.after_request
+    def compress_response(response):
+        if compressor is None or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+
+        response.vary.add("Accept-Encoding")
+
+        if ("Content-Encoding" in response.headers or response.direct_passthrough
+                or response.status_code < CODE["200_OK"] or response.status_code in (204, 304)):
+            return response
+
+        encoding = compressor.negotiate(request)
+
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compressor.compress_stream(response.response, encoding)
+        else:
+            body = response.get_data()
+
+            if len(body) < compressor.min_size:
+                return response
+
+            response.set_data(compressor.compress(body, encoding))
+
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def is_cacheable_request():
+        return (app.config["RESPONSE_CACHE_ENABLED"]
+                and request.method == "GET"
+                and request.endpoint in cacheable_endpoints)
+
+    # Serves the negotiated compressed copy of a cached body, compressed once per entry and encoding
+    # (concurrent requests for the same copy wait for one compression rather than each running it)
+    def cache_headers(response, key, entry):
+        etag = entry["etag"]
+        encoding = compressor.negotiate(request) if compressor is not None else None
+
+        if encoding is not None and len(entry["body"]) >= compressor.min_size:
+            response.set_data(compression_flights.run(
+                (key, etag, encoding),
+                lambda: response_cache.encoded_body(key, entry, encoding,
+                                                    lambda body: compressor.compress(body, encoding))))
+            response.headers["Content-Encoding"] = encoding
+            # Each encoding is a different representation, so it gets its own strong ETag
+            etag = "{}-{}".format(etag, encoding)
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "public, max-age={}, must-revalidate".format(
+            app.config["RESPONSE_CACHE_MAX_AGE"])
+        return response.make_conditional(request)
+
+    # Serve cached responses (or 304 Not Modified) before the view runs
+    @app.before_request
+    def serve_cached_response():
+        if not is_cacheable_request():
+            return None
+
+        # Captured before the view reads anything, so a write committed mid-request leaves the entry stale
+        g.data_version = data_version.value
+        key = cache_key(request, response_mimetype())
+        entry = response_cache.get(key, g.data_version)
+
+        if entry is None:
+            return None
+
+        g.response_cache_hit = True
+        return cache_headers(app.response_class(entry["body"], mimetype=entry["mimetype"]), key, entry)
+
+    # Store fresh responses of cacheable endpoints, tagged with the data version they were built at
+    @app.after_request
+    def store_cached_response(response):
+        if (not is_cacheable_request() or g.get("response_cache_hit") or response.is_streamed
+                or response.status_code != CODE["200_OK"]):
+            return response
+
+        key = cache_key(request, response_mimetype())
+        entry = response_cache.put(key, g.data_version, response.get_data(), response.mimetype)
+
+        if entry is None:
+            return response
+
+        return cache_headers(response, key, entry)
+
+    # Runs first: JSON bodies become MessagePack for clients that prefer it (streamed bodies stay JSON)
+    @app.after_request
+    def encode_msgpack_response(response):
+        if encode_msgpack is None or response.mimetype not in response_mimetypes:
+            return response
+
+        response.vary.add("Accept")
+
+        if response.is_streamed or response.mimetype == MSGPACK_MIMETYPE or response_mimetype() != MSGPACK_MIMETYPE:
+            return response
+
+        response.set_data(encode_msgpack(json.loads(response.get_data())))
+        response.mimetype = MSGPACK_MIMETYPE
+        return response
+
     @app.route('/', methods=["GET"])
     def index():
         return "Welcome to Carl's Trivia App API!"
 
     @app.route("/categories", methods=["GET"])
     def get_categories():
-        questions = Question.query.all()
-
-        categories = set()
-        for question in questions:
-            category_type = find_category_type(question.category)
-            categories.add(category_type)
+        categories = category_registry.all_types()
 
         return jsonify({
-            "categories": list(categories),
+            "categories": categories,
             "total_categories": len(categories),
             "success": True
         })
 
-    # GET 10 questions based on the current page
+    # GET per-category question counts and difficulty histograms (served from the category_stats aggregate)
+    @app.route("/categories/stats", methods=["GET"])
+    def get_category_stats():
+        counts = category_difficulty_counts()
+
+        categories = [{
+            "id": category_id,
+            "type": category_type,
+            "total_questions": sum(counts.get(category_id, {}).values()),
+            "difficulties": {str(difficulty): question_count
+                             for difficulty, question_count in sorted(counts.get(category_id, {}).items())}
+        } for category_id, category_type in category_registry.types_by_id().items()]
+
+        return jsonify({
+            "categories": categories,
+            "total_questions": sum(category["total_questions"] for category in categories),
+            "success": True
+        })
+
+    # GET 10 questions (or ?per_page=N) based on the current page, or after an ?after_id=N cursor
     @app.route("/questions", methods=["GET"])
     def get_questions():
+        per_page = get_per_page(request.args)
+
+        try:
+            after_id = get_after_id(request.args)
+        except ValueError:
+            abort(CODE["400_BAD_REQUEST"])
+
+        if per_page is None:
+            abort(CODE["400_BAD_REQUEST"])
+
+        total_questions = question_store.count() if question_store is not None else question_count.get()
+
+        # Cursor (keyset) mode: constant cost regardless of how deep the client has paged
+        if after_id is not None:
+            if question_store is not None:
+                questions = question_store.after(after_id, per_page)
+            else:
+                questions = questions_after(Question.query, after_id, per_page)
+            next_after_id = questions[-1].id if len(questions) == per_page else None
+
+            return questions_response({
+                "categories": category_registry.all_types(),
+                "current_category": None,
+                "total_questions": total_questions,
+                "per_page": per_page,
+                "next_after_id": next_after_id,
+                "success": True
+            }, questions)
+
         # Pagination logic
         page = request.args.get("page", 1, type=int)
-        total_questions = len(Question.query.all())
-        last_page = ceil(total_questions / QUESTIONS_PER_PAGE)
+        last_page = ceil(total_questions / per_page)
 
         if page <= 0 or page > last_page:
             abort(CODE["404_RESOURCE_NOT_FOUND"])
 
-        start = (page - 1) * QUESTIONS_PER_PAGE
-        end = start + QUESTIONS_PER_PAGE
-
-        questions = Question.query.all()
-        formatted_questions = [question.format() for question in questions]
-
-        categories = set()
-        for question in questions:
-            category_type = find_category_type(question.category)
-            categories.add(category_type)
+        if question_store is not None:
+            questions = question_store.page(page, per_page)
+        else:
+            questions = questions_page(Question.query, page, per_page)
 
-        return jsonify({
-            "categories": list(categories),
+        return questions_response({
+            "categories": category_registry.all_types(),
             "current_category": None,
-            "questions": formatted_questions[start:end],
-            "total_questions": len(formatted_questions),
+            "total_questions": total_questions,
+            "per_page": per_page,
             "success": True
-        })
+        }, questions)
 
     # DELETE a question (via it's id)
     @app.route("/questions/<int:question_id>", methods=["DELETE"])
     def delete_question(question_id):
-        error = False
+        question_to_delete = Question.query.filter(Question.id == question_id).one_or_none()
+
+        # Deleting a question that no longer exists is a no-op (DELETE is idempotent)
+        if question_to_delete is not None:
+            try:
+                Question.delete(question_to_delete)
+            except:
+                db.session.rollback()
+                print(sys.exc_info())
+                abort(CODE["500_INTERNAL_SERVER_ERROR"])
+
+        return jsonify({
+            "success": True
+        })
+
+    # DELETE many questions (body {"ids": [...]}) in one statement and one transaction
+    @app.route("/questions", methods=["DELETE"])
+    def delete_many_questions():
+        body = request.get_json()
+        ids = body.get("ids") if isinstance(body, dict) else None
+
+        if not isinstance(ids, list) or not ids or len(ids) > MAX_BATCH_IDS \
+                or not all(is_question_id(question_id) for question_id in ids):
+            abort(CODE["400_BAD_REQUEST"])
 
         try:
-            question_to_delete = Question.query.filter(Question.id == question_id).one_or_none()
+            deleted_ids, missing_ids = delete_questions(ids)
+        except:
+            print(sys.exc_info())
+            abort(CODE["500_INTERNAL_SERVER_ERROR"])
+
+        return jsonify({
+            "deleted": deleted_ids,
+            "not_found": missing_ids,
+            "total_deleted": len(deleted_ids),
+            "success": True
+        })
+
+    # PATCH many questions (body {"questions": [{"id": ..., <fields to change>}, ...]}) in one statement
+    # and one transaction
+    @app.route("/questions", methods=["PATCH"])
+    def update_many_questions():
+        body = request.get_json()
+        question_updates = body.get("questions") if isinstance(body, dict) else None
+
+        if not isinstance(question_updates, list) or not question_updates or len(question_updates) > MAX_BATCH_IDS:
+            abort(CODE["400_BAD_REQUEST"])
+
+        updates = {}
 
-            Question.delete(question_to_delete)
+        for question_update in question_updates:
+            question_id, values, error = validate_question_update(question_update)
+
+            if error is not None:
+                abort(CODE["422_UNPROCESSABLE_ENTITY"])
+
+            updates.setdefault(question_id, {}).update(values)
+
+        try:
+            updated_ids, missing_ids = update_questions(updates)
         except:
-            db.session.rollback()
             print(sys.exc_info())
-            error = True
-        finally:
-            db.session.close()
+            abort(CODE["500_INTERNAL_SERVER_ERROR"])
 
         return jsonify({
+            "updated": updated_ids,
+            "not_found": missing_ids,
+            "total_updated": len(updated_ids),
             "success": True
         })
 
     # POST a new question
     @app.route("/questions", methods=["POST"])
     def post_question():
-        try:
-            new_question_data = request.get_json()
+        new_question_data = request.get_json()
+
+        if not isinstance(new_question_data, dict):
+            abort(CODE["400_BAD_REQUEST"])
 
+        # category is a foreign key to categories: reject unknown ones instead of failing the insert
+        if category_registry.get(new_question_data.get('category')) is None:
+            abort(CODE["422_UNPROCESSABLE_ENTITY"])
+
+        try:
             # Retrieve the parts of the question from the body
             question_text = new_question_data.get('question', None)
             answer_text = new_question_data.get('answer', None)
@@ -145,97 +512,251 @@ def create_app(test_config=None):
         except:
             abort(CODE["500_INTERNAL_SERVER_ERROR"])
 
-    # POST a search for a question
+    # POST many questions at once as a stream of NDJSON lines or CSV rows, inserted in batched transactions
+    @app.route("/questions/bulk", methods=["POST"])
+    def bulk_import_questions():
+        if request.mimetype not in ("application/x-ndjson", "text/csv"):
+            abort(CODE["400_BAD_REQUEST"])
+
+        try:
+            inserted, rejected, errors = import_questions(read_question_rows(request.stream, request.mimetype))
+        except UnicodeDecodeError:
+            abort(CODE["400_BAD_REQUEST"])
+        except:
+            print(sys.exc_info())
+            abort(CODE["500_INTERNAL_SERVER_ERROR"])
+
+        return jsonify({
+            "inserted": inserted,
+            "rejected": rejected,
+            "errors": errors,
+            "success": True
+        })
+
+    # GET every question, streamed as NDJSON (default) or CSV (?format=csv)
+    @app.route("/questions/export", methods=["GET"])
+    def bulk_export_questions():
+        export_format = request.args.get("format", "ndjson")
+
+        if export_format not in ("ndjson", "csv"):
+            abort(CODE["400_BAD_REQUEST"])
+
+        mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+
+        return app.response_class(stream_with_context(export_questions(export_format)), mimetype=mimetype)
+
+    # POST a search for a question (ranked matches on question and answer text, paged, or every match
+    # streamed with "stream": true)
     @app.route("/search", methods=["POST"])
     def search_question():
         try:
             search_data = request.get_json()
             search_term = search_data.get('searchTerm', None)
 
-            # If search is blank, show all questions to user (to allow them to reset search)
-            if search_term == '' or search_term is None:
-                all_questions = Question.query.all()
-                formatted_matched_questions = [question.format() for question in all_questions]
+            if search_data.get('stream', False) is True:
+                rows = search_question_rows(search_term, app.config["SEARCH_BACKEND"])
+                return app.response_class(stream_with_context(stream_questions_json(rows)),
+                                          mimetype="application/json")
 
-                return jsonify({
-                    "current_category": None,
-                    "questions": formatted_matched_questions,
-                    "total_questions": len(formatted_matched_questions),
-                    "success": True
-                })
+            page = int(search_data.get('page', 1))
+            per_page = min(int(search_data.get('per_page', QUESTIONS_PER_PAGE)), MAX_QUESTIONS_PER_PAGE)
 
-            # User has submitted a search, return all fuzzied results
-            else:
-                search_pattern = "%{}%".format(search_term)
-
-                fuzzy_matched_questions = (
-                    Question
-                        .query
-                        .filter(Question.question.ilike(search_pattern))
-                        .all()
-                )
-
-                formatted_matched_questions = [question.format() for question in fuzzy_matched_questions]
-
-                return jsonify({
-                    "current_category": None,
-                    "questions": formatted_matched_questions,
-                    "total_questions": len(formatted_matched_questions),
-                    "success": True
-                })
+            if page <= 0 or per_page <= 0:
+                abort(CODE["400_BAD_REQUEST"])
+
+            # Identical searches arriving together share one query and one encoded response
+            body, mimetype = search_flights.run((search_term, page, per_page),
+                                                lambda: encoded_search_page(search_term, page, per_page))
+
+            return app.response_class(body, mimetype=mimetype)
         except:
             abort(CODE["400_BAD_REQUEST"])
 
-    # GET all questions of a certain category
+    def encoded_search_page(search_term, page, per_page):
+        # If search is blank, page through all questions (to allow the user to reset search)
+        matched_questions, total_questions = search_questions(search_term, page, per_page,
+                                                              app.config["SEARCH_BACKEND"])
+
+        response = questions_response({
+            "current_category": None,
+            "total_questions": total_questions,
+            "page": page,
+            "per_page": per_page,
+            "success": True
+        }, matched_questions)
+
+        return response.get_data(), response.mimetype
+
+    # GET autocomplete suggestions for a search prefix: question texts and words starting with ?q=
+    @app.route("/search/suggest", methods=["GET"])
+    def suggest_search():
+        prefix = request.args.get("q", "")
+        limit = request.args.get("limit", SUGGESTIONS, type=int)
+
+        if not prefix.strip() or limit is None or limit <= 0:
+            abort(CODE["400_BAD_REQUEST"])
+
+        questions, terms = prefix_index.suggest(prefix, min(limit, MAX_SUGGESTIONS))
+
+        return jsonify({
+            "questions": [{"id": question_id, "question": question} for question_id, question in questions],
+            "terms": terms,
+            "success": True
+        })
+
+    # GET all questions of a certain category (streamed with ?stream=true)
     @app.route("/categories/<int:category_id>/questions", methods=["GET"])
     def get_questions_by_category(category_id):
-        category = Category.query.filter(Category.id == category_id).one_or_none()
-
-        if category is None:
+        if category_registry.get(category_id) is None:
             abort(CODE["404_RESOURCE_NOT_FOUND"])
 
-        category_questions = Question.query.filter(Question.category == category.id).all()
+        # Index lookup on questions_category_difficulty_idx
+        if request.args.get("stream", "false").lower() == "true":
+            rows = question_rows(Question.category == category_id)
+            return app.response_class(stream_with_context(stream_questions_json(rows)), mimetype="application/json")
 
-        formatted_category_questions = [question.format() for question in category_questions]
+        if question_store is not None:
+            category_questions = question_store.in_category(category_id)
+        else:
+            category_questions = Question.query.filter(Question.category == category_id).order_by(Question.id).all()
 
-        return jsonify({
+        return questions_response({
             "current_category": None,
-            "questions": formatted_category_questions,
-            "total_questions": len(formatted_category_questions),
+            "total_questions": len(category_questions),
             "success": True
-        })
+        }, category_questions)
 
-    # POST past quiz questions and get new random question
+    # POST past quiz questions and get new random question (category id 0 for all categories)
     @app.route("/quizzes", methods=["POST"])
     def get_random_quiz_question():
         body = request.get_json()
 
+        if not isinstance(body, dict):
+            abort(CODE["400_BAD_REQUEST"])
+
         # Retrieve quiz data
         previous_questions = body.get("previous_questions")
         quiz_category = body.get("quiz_category")
 
-        if previous_questions is None or quiz_category is None:
+        if not isinstance(previous_questions, list) or not isinstance(quiz_category, dict):
             abort(CODE["400_BAD_REQUEST"])
 
-        category_id = quiz_category['id']
+        category_id = category_key(quiz_category.get('id'))
+        previous_ids = [category_key(question_id) for question_id in previous_questions]
 
-        random_question = choice(
-            Question.query.filter(Question.category == category_id).all()
-        )
+        if category_id is None or None in previous_ids:
+            abort(CODE["400_BAD_REQUEST"])
 
-        current_attempts = 0
-        allowed_attempts = 3
+        # Optional target difficulty; in adaptive mode it is the difficulty of the previous turn
+        difficulty = body.get("difficulty")
+        adaptive = body.get("adaptive", False)
+        recent_results = body.get("recent_results", [])
 
-        while (current_attempts < allowed_attempts) or (random_question.id in previous_questions):
-            random_question = choice(Question.query.all())
-            current_attempts += 1
+        if difficulty is not None and category_key(difficulty) not in DIFFICULTIES:
+            abort(CODE["400_BAD_REQUEST"])
+        if not isinstance(adaptive, bool) or not isinstance(recent_results, list) \
+                or not all(isinstance(result, bool) for result in recent_results):
+            abort(CODE["400_BAD_REQUEST"])
 
+        if adaptive:
+            # Step the difficulty from the player's recent answers, then take the nearest non-empty bucket
+            difficulty = next_difficulty(category_key(difficulty or DIFFICULTIES[len(DIFFICULTIES) // 2]),
+                                         recent_results)
+            random_question = next_adaptive_quiz_question(category_id, previous_ids, difficulty, load_question)
         else:
+            difficulty = category_key(difficulty)
+            random_question = next_quiz_question(category_id, previous_ids, difficulty, load_question)
+
+        # Every matching question has been asked: the quiz is over
+        if random_question is None:
             return jsonify({
-                "question": random_question.format(),
+                "question": None,
+                "difficulty": difficulty,
+                "quiz_exhausted": True,
                 "success": True
             })
 
+        return jsonify({
+            "question": random_question.format(),
+            "difficulty": difficulty,
+            "quiz_exhausted": False,
+            "success": True
+        })
+
+    # POST a new quiz session: the server holds a shuffled question order for the category
+    @app.route("/quizzes/sessions", methods=["POST"])
+    def start_quiz():
+        body = request.get_json()
+        quiz_category = body.get("quiz_category") if isinstance(body, dict) else None
+
+        if not isinstance(quiz_category, dict) or category_key(quiz_category.get('id')) is None:
+            abort(CODE["400_BAD_REQUEST"])
+
+        session_id, total_questions = start_quiz_session(quiz_sessions, category_key(quiz_category['id']))
+
+        return jsonify({
+            "session_id": session_id,
+            "total_questions": total_questions,
+            "success": True
+        })
+
+    # POST to get the next question of a quiz session
+    @app.route("/quizzes/sessions/<session_id>/next", methods=["POST"])
+    def next_quiz_session_question(session_id):
+        try:
+            question = next_session_question(quiz_sessions, session_id)
+            remaining_questions = quiz_sessions.remaining(session_id)
+        except KeyError:
+            abort(CODE["404_RESOURCE_NOT_FOUND"])
+
+        return jsonify({
+            "question": question.format() if question is not None else None,
+            "quiz_exhausted": question is None,
+            "remaining_questions": remaining_questions,
+            "success": True
+        })
+
+    # DELETE (end) a quiz session
+    @app.route("/quizzes/sessions/<session_id>", methods=["DELETE"])
+    def end_quiz_session(session_id):
+        if not quiz_sessions.delete(session_id):
+            abort(CODE["404_RESOURCE_NOT_FOUND"])
+
+        return jsonify({
+            "success": True
+        })
+
+    # GET this process's cold-start timings
+    @app.route("/status/startup", methods=["GET"])
+    def get_startup_status():
+        return jsonify({
+            "startup": startup_times.format(),
+            "success": True
+        })
+
+    # Create the tables (the app itself no longer does this on start-up in production) and fill the
+    # category_stats aggregate from any questions already there
+    @app.cli.command("db-init")
+    def init_db_command():
+        db.create_all()
+        rebuild_category_stats()
+        print("Initialized the database.")
+
+    # GET connection pool state and checkout/wait-time counters
+    @app.route("/status/db-pool", methods=["GET"])
+    def get_db_pool_status():
+        return jsonify({
+            "pool": pool_metrics.snapshot(db.engine.pool),
+            "success": True
+        })
+
+    # The session is removed at the end of every app context (Flask-SQLAlchemy's teardown); roll back
+    # first if the request failed so no half-finished transaction goes back to the pool
+    @app.teardown_appcontext
+    def rollback_failed_session(exception):
+        if exception is not None:
+            db.session.rollback()
+
     @app.errorhandler(CODE["400_BAD_REQUEST"])
     def bad_request(error):
         return jsonify({
@@ -268,6 +789,14 @@ def create_app(test_config=None):
             "message": "Unprocessable entity",
         }), CODE["422_UNPROCESSABLE_ENTITY"]
 
+    @app.errorhandler(CODE["429_TOO_MANY_REQUESTS"])
+    def too_many_requests(error):
+        return jsonify({
+            "success": False,
+            "error": CODE["429_TOO_MANY_REQUESTS"],
+            "message": "Too many requests",
+        }), CODE["429_TOO_MANY_REQUESTS"], {"Retry-After": str(max(1, ceil(g.get("retry_after", 1))))}
+
     @app.errorhandler(CODE["500_INTERNAL_SERVER_ERROR"])
     def internal_server_error(error):
         return jsonify({
@@ -279,4 +808,15 @@ def create_app(test_config=None):
     if __name__ == "__main__":
         app.run()
 
+    # Derived-data maintenance after bulk writes (category counts, cache warm-up) runs on background workers
+    job_queue.init_app(app)
+
+    # Load the in-process caches off the request path; requests arriving first load them lazily as before
+    if app.config["CACHE_WARMUP_ENABLED"]:
+        warm_caches_in_background(app, question_store)
+
+    startup_times.create_app = perf_counter() - create_app_started
+    app.logger.info("Started in %.1f ms (imports %.1f ms)", startup_times.create_app * 1000,
+                    startup_times.imports * 1000)
+
     return app
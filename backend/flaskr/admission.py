@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from threading import BoundedSemaphore, Event, Lock
+from time import monotonic
+
+RATE_LIMIT_PER_SECOND = 10
+RATE_LIMIT_BURST = 50
+RATE_LIMIT_MAX_CLIENTS = 100000
+MAX_CONCURRENT_REQUESTS = 64
+
+
+'''
+TokenBucketLimiter
+    per-client token buckets: each client may burst up to `burst` requests and
+    then gets `rate` requests per second. Buckets of the least recently seen
+    clients are dropped beyond max_clients.
+'''
+
+
+class TokenBucketLimiter:
+
+    def __init__(self, rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST, max_clients=RATE_LIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = Lock()
+        self._buckets = OrderedDict()
+
+    # Takes one token; returns 0 when the request may go ahead, else the seconds until a token is free
+    def acquire(self, client):
+        now = monotonic()
+
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+
+            self._buckets[client] = (tokens, now)
+
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+
+        return wait
+
+
+'''
+ConcurrencyLimiter
+    caps the requests being handled at once. Requests over the cap are refused
+    straight away (load shedding) rather than queued behind slow ones.
+'''
+
+
+class ConcurrencyLimiter:
+
+    def __init__(self, limit=MAX_CONCURRENT_REQUESTS):
+        self._slots = BoundedSemaphore(limit)
+
+    def try_acquire(self):
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+'''
+SingleFlight
+    coalesces concurrent calls with the same key: the first caller runs the
+    function, callers arriving while it runs wait and share its result (or
+    exception) instead of running it again.
+'''
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = Lock()
+        self._flights = {}
+
+    def run(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+
+            if flight.error is not None:
+                raise flight.error
+
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
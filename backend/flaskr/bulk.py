@@ -0,0 +1,261 @@
+import csv
+import io
+import json
+
+from sqlalchemy import case
+
+from .category_registry import category_registry
+from .jobs import job_queue
+from .json_fragments import clear_question_fragments
+from .models import db, Question
+from .pagination import question_count
+from .quiz import quiz_question_pool
+from .response_cache import data_version
+from .search import trigram_index
+from .shared_version import bump_shared_version
+from .streaming import format_question_row, question_rows
+from .suggest import prefix_index
+
+BULK_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+MAX_BATCH_IDS = 10000
+
+QUESTION_FIELDS = ("question", "answer", "category", "difficulty")
+
+
+#  Helper function to drop (or rebuild) every structure derived from the questions table.
+#  Needed after set-based (Core) statements, which bypass the ORM events that keep them current.
+#  The in-process caches are dropped straight away; the category_stats aggregate is rebuilt and the
+#  caches warmed again by background jobs, so the write returns without waiting for either.
+def invalidate_derived_question_data():
+    # Other worker processes see no ORM events for these writes either: move the shared version on
+    bump_shared_version(db.session)
+    db.session.commit()
+
+    question_count.invalidate()
+    trigram_index.invalidate()
+    prefix_index.invalidate()
+    quiz_question_pool.invalidate()
+    clear_question_fragments()
+    data_version.bump()
+    job_queue.enqueue("rebuild_category_stats")
+    job_queue.enqueue("warm_caches", optional=True)
+
+
+#  Helper function to validate one imported row; returns (row, None) or (None, reason).
+def validate_question_row(row):
+    if not isinstance(row, dict):
+        return None, "row is not an object"
+
+    question, answer = row.get("question"), row.get("answer")
+
+    if not isinstance(question, str) or not question.strip():
+        return None, "question is required"
+    if not isinstance(answer, str) or not answer.strip():
+        return None, "answer is required"
+
+    try:
+        category = int(row.get("category"))
+        difficulty = int(row.get("difficulty"))
+    except (TypeError, ValueError):
+        return None, "category and difficulty must be integers"
+
+    if category_registry.get(category) is None:
+        return None, "unknown category {}".format(category)
+    if not 1 <= difficulty <= 5:
+        return None, "difficulty must be between 1 and 5"
+
+    return {"question": question, "answer": answer, "category": category, "difficulty": difficulty}, None
+
+
+#  Helper function to check for an integer question id (booleans are ints in Python, so rule them out).
+def is_question_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+#  Helper function to validate one partial update ({"id": ..., plus any question fields});
+#  returns (question id, values, None) or (None, None, reason).
+def validate_question_update(update):
+    if not isinstance(update, dict) or not is_question_id(update.get("id")):
+        return None, None, "id is required"
+
+    values = {field: update[field] for field in QUESTION_FIELDS if field in update}
+
+    if not values:
+        return None, None, "no fields to update"
+
+    for field in ("question", "answer"):
+        if field in values and (not isinstance(values[field], str) or not values[field].strip()):
+            return None, None, "{} must not be empty".format(field)
+
+    try:
+        values.update({field: int(values[field]) for field in ("category", "difficulty") if field in values})
+    except (TypeError, ValueError):
+        return None, None, "category and difficulty must be integers"
+
+    if "category" in values and category_registry.get(values["category"]) is None:
+        return None, None, "unknown category {}".format(values["category"])
+    if "difficulty" in values and not 1 <= values["difficulty"] <= 5:
+        return None, None, "difficulty must be between 1 and 5"
+
+    return update["id"], values, None
+
+
+#  Helper function to run a set-based statement over `ids` and return the ids it touched, with RETURNING
+#  on Postgres and a SELECT of the matching ids in the same transaction elsewhere.
+def _execute_for_ids(statement, ids):
+    table = Question.__table__
+
+    if db.engine.dialect.name == "postgresql":
+        return sorted(row_id for row_id, in db.session.execute(statement.returning(table.c.id)))
+
+    affected_ids = sorted(row_id for row_id, in db.session.execute(table.select()
+                                                                   .with_only_columns([table.c.id])
+                                                                   .where(table.c.id.in_(ids))))
+    db.session.execute(statement)
+
+    return affected_ids
+
+
+#  Helper function to delete many questions in one statement and one transaction.
+#  Returns (deleted ids, ids that did not exist).
+def delete_questions(ids):
+    ids = sorted(set(ids))
+    table = Question.__table__
+
+    try:
+        deleted_ids = _execute_for_ids(table.delete().where(table.c.id.in_(ids)), ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if deleted_ids:
+        invalidate_derived_question_data()
+
+    return deleted_ids, sorted(set(ids) - set(deleted_ids))
+
+
+#  Helper function to apply many partial updates ({question id: {field: value}}) as one UPDATE ... SET
+#  field = CASE id WHEN ... END statement in one transaction. Returns (updated ids, ids that did not exist).
+def update_questions(updates):
+    ids = sorted(updates)
+    table = Question.__table__
+    values = {}
+
+    for field in QUESTION_FIELDS:
+        whens = {question_id: fields[field] for question_id, fields in updates.items() if field in fields}
+
+        if whens:
+            values[field] = case(whens, value=table.c.id, else_=table.c[field])
+
+    try:
+        updated_ids = _execute_for_ids(table.update().where(table.c.id.in_(ids)).values(values), ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if updated_ids:
+        invalidate_derived_question_data()
+
+    return updated_ids, sorted(set(ids) - set(updated_ids))
+
+
+#  Helper function to parse an NDJSON or CSV byte stream lazily into (line number, row) pairs.
+def read_question_rows(stream, content_type: str):
+    lines = (line.decode("utf-8") for line in stream)
+
+    if content_type == "text/csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+
+def _copy_batch(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[field] for field in QUESTION_FIELDS])
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert("COPY questions (question, answer, category, difficulty) FROM STDIN WITH CSV", buffer)
+
+
+def _insert_batch(rows):
+    if db.engine.dialect.name == "postgresql":
+        _copy_batch(rows)
+    else:
+        db.session.execute(Question.__table__.insert(), rows)
+
+    db.session.commit()
+
+
+#  Helper function to validate and insert streamed rows in batched transactions (COPY on Postgres,
+#  executemany elsewhere). Returns (inserted count, rejected count, first MAX_REPORTED_ERRORS errors).
+def import_questions(rows, batch_size: int = BULK_BATCH_SIZE):
+    inserted, rejected, errors = 0, 0, []
+    batch = []
+
+    try:
+        for line_number, row in rows:
+            valid_row, error = validate_question_row(row)
+
+            if error is not None:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_number, "error": error})
+                continue
+
+            batch.append(valid_row)
+
+            if len(batch) >= batch_size:
+                _insert_batch(batch)
+                inserted += len(batch)
+                batch = []
+
+        if batch:
+            _insert_batch(batch)
+            inserted += len(batch)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if inserted:
+            invalidate_derived_question_data()
+
+    return inserted, rejected, errors
+
+
+#  Helper function to stream every question as NDJSON or CSV lines through a server-side cursor.
+def export_questions(export_format: str = "ndjson"):
+    rows = question_rows()
+
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(("id",) + QUESTION_FIELDS)
+
+        for row in rows:
+            writer.writerow(row)
+
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue()
+        return
+
+    for row in rows:
+        yield json.dumps(format_question_row(row)) + "\n"
@@ -0,0 +1,60 @@
+from threading import RLock
+
+from sqlalchemy import event
+
+from .models import Category
+
+
+'''
+CategoryRegistry
+    in-process id -> type lookup for the categories table.
+    The table is read once on first use and re-read lazily after any
+    Category insert, update or delete.
+'''
+
+
+class CategoryRegistry:
+
+    def __init__(self):
+        self._lock = RLock()
+        self._types = None
+
+    def _load(self):
+        with self._lock:
+            if self._types is None:
+                rows = Category.query.with_entities(Category.id, Category.type).order_by(Category.id).all()
+                self._types = {category_id: category_type for category_id, category_type in rows}
+
+            return self._types
+
+    def types_by_id(self):
+        types = self._types
+
+        if types is None:
+            types = self._load()
+
+        return types
+
+    def get(self, category_id):
+        try:
+            return self.types_by_id().get(int(category_id))
+        except (TypeError, ValueError):
+            return None
+
+    def all_types(self):
+        return list(self.types_by_id().values())
+
+    def invalidate(self):
+        with self._lock:
+            self._types = None
+
+
+category_registry = CategoryRegistry()
+
+
+def _invalidate_category_registry(mapper, connection, target):
+    category_registry.invalidate()
+
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(Category, _event_name, _invalidate_category_registry)
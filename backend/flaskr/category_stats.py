@@ -0,0 +1,88 @@
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+from .models import db, Question, CategoryStat
+
+category_stats_table = CategoryStat.__table__
+
+
+#  Helper function to add `delta` to the (category, difficulty) count on the flush's own connection,
+#  so the aggregate commits or rolls back together with the question write.
+def _adjust_count(connection, category, difficulty, delta):
+    if category is None or difficulty is None:
+        return
+
+    category, difficulty = int(category), int(difficulty)
+    key = (category_stats_table.c.category == category) & (category_stats_table.c.difficulty == difficulty)
+
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            postgresql_insert(category_stats_table)
+                .values(category=category, difficulty=difficulty, question_count=max(delta, 0))
+                .on_conflict_do_update(index_elements=["category", "difficulty"],
+                                       set_={"question_count": category_stats_table.c.question_count + delta})
+        )
+        return
+
+    updated = connection.execute(
+        category_stats_table.update().where(key).values(question_count=category_stats_table.c.question_count + delta)
+    )
+
+    if not updated.rowcount and delta > 0:
+        connection.execute(category_stats_table.insert().values(category=category, difficulty=difficulty,
+                                                                question_count=delta))
+
+
+def _count_inserted_question(mapper, connection, target):
+    _adjust_count(connection, target.category, target.difficulty, 1)
+
+
+def _count_deleted_question(mapper, connection, target):
+    _adjust_count(connection, target.category, target.difficulty, -1)
+
+
+def _recount_updated_question(mapper, connection, target):
+    state = inspect(target)
+    category_history = state.attrs.category.history
+    difficulty_history = state.attrs.difficulty.history
+
+    if not category_history.has_changes() and not difficulty_history.has_changes():
+        return
+
+    old_category = category_history.deleted[0] if category_history.deleted else target.category
+    old_difficulty = difficulty_history.deleted[0] if difficulty_history.deleted else target.difficulty
+
+    _adjust_count(connection, old_category, old_difficulty, -1)
+    _adjust_count(connection, target.category, target.difficulty, 1)
+
+
+event.listen(Question, "after_insert", _count_inserted_question)
+event.listen(Question, "after_delete", _count_deleted_question)
+event.listen(Question, "after_update", _recount_updated_question)
+
+
+#  Helper function to recompute the whole aggregate from the questions table in one statement.
+#  Used after set-based (Core) writes, which bypass the ORM events above.
+def rebuild_category_stats():
+    counts = (
+        select([Question.category, Question.difficulty, func.count(Question.id)])
+            .where(Question.category.isnot(None) & Question.difficulty.isnot(None))
+            .group_by(Question.category, Question.difficulty)
+    )
+
+    db.session.execute(category_stats_table.delete())
+    db.session.execute(category_stats_table.insert().from_select(["category", "difficulty", "question_count"],
+                                                                 counts))
+    db.session.commit()
+
+
+#  Helper function to read the aggregate as {category id: {difficulty: count}}.
+def category_difficulty_counts():
+    counts = {}
+
+    for category, difficulty, question_count in db.session.query(CategoryStat.category, CategoryStat.difficulty,
+                                                                 CategoryStat.question_count):
+        if question_count:
+            counts.setdefault(category, {})[difficulty] = question_count
+
+    return counts
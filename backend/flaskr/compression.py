@@ -0,0 +1,76 @@
+import zlib
+
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+MSGPACK_MIMETYPE = "application/msgpack"
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", MSGPACK_MIMETYPE, "text/csv", "text/html",
+                          "text/plain"}
+
+
+'''
+ResponseCompressor
+    negotiates a Content-Encoding from Accept-Encoding (br when the optional
+    'brotli' package is installed, then gzip) and compresses whole bodies or
+    streamed chunks with it.
+'''
+
+
+class ResponseCompressor:
+
+    def __init__(self, min_size=COMPRESSION_MIN_SIZE):
+        self.min_size = min_size
+
+        # Imported on demand: optional, gzip alone is used without it
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+
+        self._brotli = brotli
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    # The client's preferred encoding we support, or None to send the body as is
+    def negotiate(self, request):
+        return request.accept_encodings.best_match(self.encodings)
+
+    def compress(self, body, encoding):
+        if encoding == "br":
+            return self._brotli.compress(body, quality=BROTLI_QUALITY)
+
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        return compressor.compress(body) + compressor.flush()
+
+    # Compresses a streamed body chunk by chunk, closing the original stream (and its request context) after
+    def compress_stream(self, chunks, encoding):
+        if encoding == "br":
+            compressor = self._brotli.Compressor(quality=BROTLI_QUALITY)
+            compress, finish = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+            compress, finish = compressor.compress, compressor.flush
+
+        try:
+            for chunk in chunks:
+                compressed = compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+
+                if compressed:
+                    yield compressed
+
+            yield finish()
+        finally:
+            close = getattr(chunks, "close", None)
+
+            if close is not None:
+                close()
+
+
+#  Helper function to load the MessagePack encoder; returns None when the optional 'msgpack' package is missing.
+def msgpack_encoder():
+    try:
+        import msgpack
+    except ImportError:
+        return None
+
+    return lambda obj: msgpack.packb(obj, use_bin_type=True)
@@ -0,0 +1,158 @@
+import os
+from threading import Lock, local
+from time import perf_counter
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+DB_POOL_MODE = "queue"
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 1800
+DB_POOL_PRE_PING = True
+
+
+'''
+PoolMetrics
+    process-wide connection pool counters: checkouts, checkins, checkout
+    timeouts, the time spent waiting for a free connection and, apart from
+    it, the new connections opened and the time spent opening them.
+'''
+
+
+class PoolMetrics:
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkins = 0
+            self.timeouts = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+            self.connects = 0
+            self.connect_seconds_total = 0.0
+            self.connect_seconds_max = 0.0
+
+    def record_checkout(self, wait_seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def record_connect(self, connect_seconds):
+        with self._lock:
+            self.connects += 1
+            self.connect_seconds_total += connect_seconds
+            self.connect_seconds_max = max(self.connect_seconds_max, connect_seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_checkin(self):
+        with self._lock:
+            self.checkins += 1
+
+    def snapshot(self, pool=None):
+        with self._lock:
+            snapshot = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "connects": self.connects,
+                "connect_seconds_total": self.connect_seconds_total,
+                "connect_seconds_max": self.connect_seconds_max,
+            }
+
+        if isinstance(pool, QueuePool):
+            snapshot.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            })
+
+        return snapshot
+
+
+pool_metrics = PoolMetrics()
+
+# The checkout in progress on this thread: QueuePool._do_get calls itself again when it loses a race
+_checkout = local()
+
+
+class _InstrumentedPool:
+
+    def _do_get(self):
+        if getattr(_checkout, "active", False):
+            return super()._do_get()
+
+        _checkout.active = True
+        _checkout.connect_seconds = 0.0
+        started = perf_counter()
+
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        finally:
+            _checkout.active = False
+
+        # Opening a new connection is not waiting for one: it is counted under connects instead
+        pool_metrics.record_checkout(perf_counter() - started - _checkout.connect_seconds)
+        return connection
+
+    def _create_connection(self):
+        started = perf_counter()
+
+        try:
+            return super()._create_connection()
+        finally:
+            connect_seconds = perf_counter() - started
+            _checkout.connect_seconds = getattr(_checkout, "connect_seconds", 0.0) + connect_seconds
+            pool_metrics.record_connect(connect_seconds)
+
+    def _do_return_conn(self, conn):
+        pool_metrics.record_checkin()
+        super()._do_return_conn(conn)
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_InstrumentedPool, NullPool):
+    pass
+
+
+#  Helper function to build SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* settings.
+#  "null" mode opens a connection per checkout, for use behind PgBouncer (transaction pooling).
+#  SQLite keeps SQLAlchemy's own pool choice, which depends on whether the database is in memory.
+def engine_options(database_path: str, config=os.environ):
+    if database_path.startswith("sqlite"):
+        return {}
+
+    options = {
+        "pool_pre_ping": str(config.get("DB_POOL_PRE_PING", DB_POOL_PRE_PING)).lower() == "true",
+    }
+
+    if config.get("DB_POOL_MODE", DB_POOL_MODE) == "null":
+        options["poolclass"] = InstrumentedNullPool
+        return options
+
+    options.update({
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": int(config.get("DB_POOL_SIZE", DB_POOL_SIZE)),
+        "max_overflow": int(config.get("DB_MAX_OVERFLOW", DB_MAX_OVERFLOW)),
+        "pool_timeout": float(config.get("DB_POOL_TIMEOUT", DB_POOL_TIMEOUT)),
+        "pool_recycle": int(config.get("DB_POOL_RECYCLE", DB_POOL_RECYCLE)),
+    })
+
+    return options
@@ -1,13 +1,6 @@
-from .models import Category
+from .category_registry import category_registry
 
 
-#  Helper function to find the category type.
+#  Helper function to find the category type (served from the in-process category registry).
 def find_category_type(id: int):
-    categories: [] = Category.query.all()
-    category_found = None
-
-    for category in categories:
-        if category.id == id:
-            category_found = category.type
-
-    return category_found
+    return category_registry.get(id)
@@ -0,0 +1,208 @@
+import cProfile
+import heapq
+import os
+import random
+from threading import Lock
+from time import perf_counter, time
+
+from flask import g, has_request_context, request
+from flask.json import JSONEncoder
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .db_pool import pool_metrics
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_KEEP = 20
+
+
+'''
+RouteMetrics
+    per-route request latency histograms plus SQL query, SQL time and JSON
+    serialization totals, rendered in the Prometheus text exposition format.
+'''
+
+
+class RouteMetrics:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = Lock()
+        self._routes = {}
+
+    def observe(self, route, method, duration, sql_queries, sql_seconds, json_seconds):
+        with self._lock:
+            metrics = self._routes.get((route, method))
+
+            if metrics is None:
+                metrics = self._routes[(route, method)] = {
+                    "buckets": [0] * len(self.buckets),
+                    "count": 0,
+                    "sum": 0.0,
+                    "sql_queries": 0,
+                    "sql_seconds": 0.0,
+                    "json_seconds": 0.0,
+                }
+
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    metrics["buckets"][i] += 1
+            metrics["count"] += 1
+            metrics["sum"] += duration
+            metrics["sql_queries"] += sql_queries
+            metrics["sql_seconds"] += sql_seconds
+            metrics["json_seconds"] += json_seconds
+
+    def render(self):
+        with self._lock:
+            routes = {key: dict(metrics, buckets=list(metrics["buckets"])) for key, metrics in self._routes.items()}
+
+        lines = [
+            "# HELP trivia_request_duration_seconds Request latency by route.",
+            "# TYPE trivia_request_duration_seconds histogram",
+        ]
+        for (route, method), metrics in sorted(routes.items()):
+            labels = 'route="{}",method="{}"'.format(route, method)
+            for bound, count in zip(self.buckets, metrics["buckets"]):
+                lines.append('trivia_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(labels, bound, count))
+            lines.append('trivia_request_duration_seconds_bucket{{{},le="+Inf"}} {}'.format(labels, metrics["count"]))
+            lines.append("trivia_request_duration_seconds_sum{{{}}} {}".format(labels, metrics["sum"]))
+            lines.append("trivia_request_duration_seconds_count{{{}}} {}".format(labels, metrics["count"]))
+
+        for name, key, help_text in (
+                ("trivia_request_sql_queries_total", "sql_queries", "SQL statements executed, by route."),
+                ("trivia_request_sql_seconds_total", "sql_seconds", "Time spent executing SQL, by route."),
+                ("trivia_request_json_seconds_total", "json_seconds", "Time spent encoding JSON, by route.")):
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} counter".format(name))
+            for (route, method), metrics in sorted(routes.items()):
+                lines.append('{}{{route="{}",method="{}"}} {}'.format(name, route, method, metrics[key]))
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_metrics = RouteMetrics()
+
+
+#  Helper function to render the connection pool counters (see db_pool.py) as Prometheus metrics.
+def render_pool_metrics(pool):
+    lines = []
+
+    for key, value in sorted(pool_metrics.snapshot(pool).items()):
+        name = "trivia_db_pool_" + key
+        lines.append("# TYPE {} {}".format(name, "counter" if key in ("checkouts", "checkins", "timeouts",
+                                                                         "wait_seconds_total") else "gauge"))
+        lines.append("{} {}".format(name, value))
+
+    return "\n".join(lines) + "\n"
+
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(perf_counter())
+
+
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+
+    if has_request_context() and "sql_queries" in g:
+        g.sql_queries += 1
+        g.sql_seconds += perf_counter() - started
+
+
+class TimedJSONEncoder(JSONEncoder):
+
+    def encode(self, o):
+        started = perf_counter()
+
+        try:
+            return super().encode(o)
+        finally:
+            if has_request_context() and "json_seconds" in g:
+                g.json_seconds += perf_counter() - started
+
+
+'''
+SlowRequestProfiler
+    keeps cProfile dumps of the PROFILE_KEEP slowest sampled requests in PROFILE_DIR.
+'''
+
+
+class SlowRequestProfiler:
+
+    def __init__(self, directory, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self._lock = Lock()
+        self._slowest = []
+
+    def save(self, profile, duration, route):
+        filename = os.path.join(self.directory, "{:09.1f}ms-{}-{}.prof".format(
+            duration * 1000, route.strip("/").replace("/", "_").replace("<", "").replace(">", "") or "index",
+            int(time() * 1000)))
+
+        with self._lock:
+            if len(self._slowest) >= self.keep and duration <= self._slowest[0][0]:
+                return None
+
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(filename)
+            heapq.heappush(self._slowest, (duration, filename))
+
+            if len(self._slowest) > self.keep:
+                _, fastest_filename = heapq.heappop(self._slowest)
+                if os.path.exists(fastest_filename):
+                    os.remove(fastest_filename)
+
+        return filename
+
+
+#  Helper function to wire the opt-in instrumentation into an app.
+#  Must run before any other before_request hook so that early (e.g. cached) responses are timed too.
+def init_instrumentation(app, db):
+    if not event.contains(Engine, "before_cursor_execute", _start_query_timer):
+        event.listen(Engine, "before_cursor_execute", _start_query_timer)
+        event.listen(Engine, "after_cursor_execute", _stop_query_timer)
+
+    app.json_encoder = TimedJSONEncoder
+    sample_rate = float(app.config.get("PROFILE_SAMPLE_RATE", 0))
+    profiler = SlowRequestProfiler(app.config.get("PROFILE_DIR", os.path.join(app.instance_path, "profiles")),
+                                   int(app.config.get("PROFILE_KEEP", PROFILE_KEEP)))
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+        g.json_seconds = 0.0
+
+        if sample_rate and random.random() < sample_rate:
+            g.profile = cProfile.Profile()
+            g.profile.enable()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if "request_started" not in g:
+            return response
+
+        duration = perf_counter() - g.request_started
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+        if "profile" in g:
+            g.profile.disable()
+            profiler.save(g.profile, duration, route)
+
+        route_metrics.observe(route, request.method, duration, g.sql_queries, g.sql_seconds, g.json_seconds)
+        response.headers["Server-Timing"] = 'app;dur={:.2f}, db;dur={:.2f};desc="{} queries", json;dur={:.2f}'.format(
+            duration * 1000, g.sql_seconds * 1000, g.sql_queries, g.json_seconds * 1000)
+
+        return response
+
+    # GET metrics in the Prometheus text exposition format
+    @app.route("/metrics", methods=["GET"])
+    def get_metrics():
+        return app.response_class(route_metrics.render() + render_pool_metrics(db.engine.pool),
+                                  mimetype="text/plain; version=0.0.4")
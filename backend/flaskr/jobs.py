@@ -0,0 +1,227 @@
+import json
+import sys
+from datetime import datetime, timedelta
+from queue import Full, Queue
+from threading import Lock, Thread, Timer
+
+from flask import current_app
+
+from .category_stats import rebuild_category_stats
+from .models import db, Job
+from .response_cache import data_version
+from .shared_version import bump_shared_version
+from .warmup import load_caches
+
+JOB_QUEUE_WORKERS = 2
+JOB_QUEUE_MAX_SIZE = 1000
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 1.0
+JOB_LEASE_SECONDS = 600
+
+jobs_table = Job.__table__
+
+
+'''
+JobQueue
+    in-process background jobs: a bounded queue drained by a small pool of
+    worker threads, each job run in the app context. Failed jobs are retried
+    with exponential backoff up to max_attempts. A job already waiting in the
+    queue is not queued twice (it will see the latest data when it runs).
+    With persistent=True every job is also written to the jobs table and
+    deleted once it succeeds, so jobs left by a stopped process are picked up
+    again after their lease runs out. Without workers (or before init_app),
+    jobs run inline in the caller.
+'''
+
+
+class JobQueue:
+
+    def __init__(self):
+        self.app = None
+        self.workers = 0
+        self.max_attempts = JOB_MAX_ATTEMPTS
+        self.retry_delay = JOB_RETRY_DELAY
+        self.persistent = False
+        self.lease = timedelta(seconds=JOB_LEASE_SECONDS)
+        self._handlers = {}
+        self._lock = Lock()
+        self._pending = set()
+        self._queue = None
+        self._threads = []
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config["JOB_QUEUE_WORKERS"]
+        self.max_attempts = max(1, app.config["JOB_MAX_ATTEMPTS"])
+        self.persistent = app.config["JOB_QUEUE_PERSISTENT"]
+
+        if self.workers > 0 and not self._threads:
+            self._queue = Queue(app.config["JOB_QUEUE_MAX_SIZE"])
+
+            for number in range(self.workers):
+                thread = Thread(target=self._work, name="job-worker-{}".format(number), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        # Off the startup path: workers boot without touching the database
+        if self.persistent and self._queue is not None:
+            Thread(target=self._recover, name="job-recovery", daemon=True).start()
+
+    # Registers fn as the handler of the jobs called name
+    def job(self, name):
+        def register(fn):
+            self._handlers[name] = fn
+            return fn
+
+        return register
+
+    # Queues the job and returns straight away. Optional jobs are dropped when no worker can take them;
+    # other jobs then run inline, so a full queue slows writers down instead of losing work.
+    def enqueue(self, name, payload=None, optional=False):
+        payload = payload or {}
+        key = (name, json.dumps(payload, sort_keys=True))
+
+        if self._queue is None:
+            if not optional:
+                self._run(name, payload, None, 1)
+            return
+
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+
+        job_id = self._persist(name, payload)
+
+        try:
+            self._queue.put_nowait((key, job_id, 1))
+        except Full:
+            with self._lock:
+                self._pending.discard(key)
+
+            if not optional:
+                self._run(name, payload, job_id, 1)
+            else:
+                self._release(job_id)
+
+    # Blocks until every queued job has been run (retries scheduled for later excepted)
+    def join(self):
+        if self._queue is not None:
+            self._queue.join()
+
+    def _work(self):
+        while True:
+            key, job_id, attempt = self._queue.get()
+
+            # Enqueues from here on queue the job again, so changes made while it runs are not missed
+            with self._lock:
+                self._pending.discard(key)
+
+            try:
+                with self.app.app_context():
+                    try:
+                        self._run(key[0], json.loads(key[1]), job_id, attempt)
+                    finally:
+                        db.session.remove()
+            except:
+                print(sys.exc_info())
+            finally:
+                self._queue.task_done()
+
+    def _run(self, name, payload, job_id, attempt):
+        try:
+            self._handlers[name](**payload)
+        except:
+            db.session.rollback()
+            self._failed(name, payload, job_id, attempt, sys.exc_info())
+        else:
+            self._finished(job_id)
+
+    def _failed(self, name, payload, job_id, attempt, error):
+        if attempt < self.max_attempts and self._queue is not None:
+            delay = self.retry_delay * 2 ** (attempt - 1)
+            key = (name, json.dumps(payload, sort_keys=True))
+            timer = Timer(delay, self._retry, args=(key, job_id, attempt + 1))
+            timer.daemon = True
+            timer.start()
+            return
+
+        print("Job {} failed after {} attempt(s): {}".format(name, attempt, error))
+
+        if job_id is not None:
+            self._execute(jobs_table.update().where(jobs_table.c.id == job_id)
+                          .values(attempts=attempt, last_error=str(error[1])[:1000], claimed_at=None))
+
+    def _retry(self, key, job_id, attempt):
+        try:
+            self._queue.put_nowait((key, job_id, attempt))
+        except Full:
+            self._release(job_id)
+
+    # Writes the job to the jobs table, claimed by this process; returns its id (None when not persistent).
+    def _persist(self, name, payload):
+        if not self.persistent:
+            return None
+
+        try:
+            return self._execute(jobs_table.insert().values(name=name, payload=json.dumps(payload), attempts=0,
+                                                            claimed_at=datetime.utcnow(),
+                                                            created_at=datetime.utcnow())).inserted_primary_key[0]
+        except:
+            # The job still runs from memory; it just would not survive a restart
+            print(sys.exc_info())
+            return None
+
+    def _finished(self, job_id):
+        if job_id is not None:
+            self._execute(jobs_table.delete().where(jobs_table.c.id == job_id))
+
+    # Gives a job this process cannot run back to the table for the next recovery
+    def _release(self, job_id):
+        if job_id is not None:
+            self._execute(jobs_table.update().where(jobs_table.c.id == job_id).values(claimed_at=None))
+
+    # Queues the stored jobs no live process holds: unclaimed, or claimed longer than the lease ago
+    def _recover(self):
+        with self.app.app_context():
+            try:
+                expired = datetime.utcnow() - self.lease
+                claimable = ((jobs_table.c.claimed_at.is_(None) | (jobs_table.c.claimed_at < expired))
+                             & (jobs_table.c.attempts < self.max_attempts))
+
+                with db.engine.begin() as connection:
+                    stored = connection.execute(jobs_table.select().where(claimable)
+                                                .order_by(jobs_table.c.id)).fetchall()
+
+                for job in stored:
+                    # Claimed with a conditional UPDATE so only one process takes each job
+                    claimed = self._execute(jobs_table.update().where((jobs_table.c.id == job.id) & claimable)
+                                            .values(claimed_at=datetime.utcnow()))
+
+                    if claimed.rowcount == 1 and job.name in self._handlers:
+                        key = (job.name, json.dumps(json.loads(job.payload or "{}"), sort_keys=True))
+                        self._queue.put((key, job.id, job.attempts + 1))
+            except:
+                print(sys.exc_info())
+
+    # Runs a jobs table statement in its own transaction, apart from the caller's session
+    def _execute(self, statement):
+        with db.engine.begin() as connection:
+            return connection.execute(statement)
+
+
+job_queue = JobQueue()
+
+
+@job_queue.job("rebuild_category_stats")
+def _rebuild_category_stats():
+    rebuild_category_stats()
+    # Responses cached while the rebuild was pending hold the old counts, in every process
+    bump_shared_version(db.session)
+    db.session.commit()
+    data_version.bump()
+
+
+@job_queue.job("warm_caches")
+def _warm_caches():
+    load_caches(current_app.config["SEARCH_BACKEND"])
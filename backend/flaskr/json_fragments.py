@@ -0,0 +1,110 @@
+import json
+from threading import Lock
+from time import perf_counter
+from uuid import uuid4
+from weakref import WeakSet
+
+from flask import g, has_request_context
+from sqlalchemy import event
+
+from .models import Question
+
+JSON_ENCODERS = ("stdlib", "orjson")
+FRAGMENT_CACHE_MAX_ENTRIES = 100000
+
+# Stands in for the questions array while the envelope is encoded; random so no data can collide with it
+_QUESTIONS_MARKER = "questions-" + uuid4().hex
+
+
+#  Helper function to build the encoder selected by JSON_ENCODER. Both produce compact JSON bytes with
+#  sorted keys, like jsonify; "stdlib" output is byte for byte the same as jsonify's.
+def make_json_encoder(name="stdlib"):
+    if name == "orjson":
+        # Imported on demand: optional, and only needed for JSON_ENCODER=orjson
+        try:
+            import orjson
+        except ImportError:
+            raise RuntimeError("JSON_ENCODER=orjson requires the 'orjson' package")
+
+        return lambda obj: orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+    if name != "stdlib":
+        raise ValueError("JSON_ENCODER must be one of {}".format(", ".join(JSON_ENCODERS)))
+
+    return lambda obj: json.dumps(obj, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+# Every live cache, so Question update and delete events can evict from all of them
+_fragment_caches = WeakSet()
+
+
+'''
+QuestionFragmentCache
+    pre-encoded JSON of Question.format() per question id. Each fragment is
+    stored with the row version it was encoded from (the row's column values),
+    so a row changed by another process is re-encoded rather than served stale.
+    Updates and deletes through the ORM evict the entry straight away.
+'''
+
+
+class QuestionFragmentCache:
+
+    def __init__(self, encode, max_entries=FRAGMENT_CACHE_MAX_ENTRIES):
+        self.encode = encode
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._fragments = {}
+        _fragment_caches.add(self)
+
+    def fragment(self, question):
+        row_version = (question.question, question.answer, question.category, question.difficulty)
+        entry = self._fragments.get(question.id)
+
+        if entry is not None and entry[0] == row_version:
+            return entry[1]
+
+        encoded = self.encode(question.format())
+
+        with self._lock:
+            # Bounded without LRU bookkeeping on the hot path: start over once full
+            if len(self._fragments) >= self.max_entries:
+                self._fragments = {}
+            self._fragments[question.id] = (row_version, encoded)
+
+        return encoded
+
+    def discard(self, question_id):
+        with self._lock:
+            self._fragments.pop(question_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._fragments = {}
+
+    # Encodes payload plus a "questions" array spliced together from the cached fragments
+    def render(self, payload, questions):
+        started = perf_counter()
+        envelope = self.encode({**payload, "questions": _QUESTIONS_MARKER})
+        array = b"[" + b",".join([self.fragment(question) for question in questions]) + b"]"
+        body = envelope.replace(b'"' + _QUESTIONS_MARKER.encode("ascii") + b'"', array, 1) + b"\n"
+
+        # Counted with the rest of the JSON encoding time when instrumentation is enabled
+        if has_request_context() and "json_seconds" in g:
+            g.json_seconds += perf_counter() - started
+
+        return body
+
+
+def _evict_question_fragment(mapper, connection, target):
+    for cache in list(_fragment_caches):
+        cache.discard(target.id)
+
+
+for _event_name in ("after_update", "after_delete"):
+    event.listen(Question, _event_name, _evict_question_fragment)
+
+
+#  Helper function to drop every cached fragment, e.g. after set-based writes that bypass the ORM events.
+def clear_question_fragments():
+    for cache in list(_fragment_caches):
+        cache.clear()
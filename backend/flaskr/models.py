@@ -1,23 +1,39 @@
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, String, Integer
+import os
+from datetime import datetime
+
+from sqlalchemy import Column, String, Integer, ForeignKey, Index, DateTime, Text, DDL, event
+
+from .db_pool import engine_options
+from .replica import REPLICA_BIND, RoutingSQLAlchemy
 
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.getenv("DATABASE_URL", "postgres://{}/{}".format('localhost:5432', database_name))
+replica_database_path = os.getenv("DATABASE_REPLICA_URL")
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    connection pool sizing comes from the DB_POOL_* environment variables (see db_pool.py)
+    tables are created here only when DB_CREATE_ALL is true (the default outside production);
+    production deployments create them once with `flask db-init`
+    with a replica_path (DATABASE_REPLICA_URL), read-only endpoints read from that
+    database (see replica.py) while every write goes to database_path
 '''
 
 
-def setup_db(app, database_path=database_path):
+def setup_db(app, database_path=database_path, replica_path=replica_database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
+    app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND: replica_path} if replica_path else None
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
-    db.create_all()
+
+    default_create_all = "false" if os.getenv("FLASK_ENV") == "production" else "true"
+    if os.getenv("DB_CREATE_ALL", default_create_all).lower() == "true":
+        db.create_all()
 
 
 '''
@@ -28,13 +44,19 @@ Question
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        # Serves category browsing (leading column) and per-difficulty quiz selection
+        Index('questions_category_difficulty_idx', 'category', 'difficulty'),
+    )
 
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
+    category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE', ondelete='SET NULL'))
     difficulty = Column(Integer)
 
+    parent_category = db.relationship('Category', back_populates='questions')
+
     def __init__(self, question, answer, category, difficulty):
         self.question = question
         self.answer = answer
@@ -74,6 +96,8 @@ class Category(db.Model):
     id = Column(Integer, primary_key=True)
     type = Column(String)
 
+    questions = db.relationship('Question', back_populates='parent_category', lazy='dynamic', passive_deletes=True)
+
     def __init__(self, type):
         self.type = type
 
@@ -82,3 +106,63 @@ class Category(db.Model):
             'id': self.id,
             'type': self.type
         }
+
+
+'''
+CategoryStat
+    question count per (category, difficulty), maintained incrementally
+    from Question writes (see category_stats.py)
+'''
+
+
+class CategoryStat(db.Model):
+    __tablename__ = 'category_stats'
+
+    category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE', ondelete='CASCADE'), primary_key=True)
+    difficulty = Column(Integer, primary_key=True)
+    question_count = Column(Integer, nullable=False, default=0)
+
+    def format(self):
+        return {
+            'category': self.category,
+            'difficulty': self.difficulty,
+            'question_count': self.question_count
+        }
+
+
+'''
+Job
+    a background job written to the jobs table when JOB_QUEUE_PERSISTENT is
+    set, deleted once it has run (see jobs.py). claimed_at is when a process
+    took the job; a job claimed longer than the lease ago is taken over.
+'''
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default='{}')
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    claimed_at = Column(DateTime)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+'''
+SharedDataVersion
+    single-row counter bumped in every transaction that writes questions or
+    categories, polled by each worker process to drop the in-process caches
+    another process's write has made stale (see shared_version.py)
+'''
+
+
+class SharedDataVersion(db.Model):
+    __tablename__ = 'data_versions'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+event.listen(SharedDataVersion.__table__, "after_create", DDL("INSERT INTO data_versions (id, version) VALUES (1, 0)"))
@@ -0,0 +1,98 @@
+from threading import Lock
+
+from sqlalchemy import event, func
+
+from .models import db, Question
+
+QUESTIONS_PER_PAGE = 10
+MAX_QUESTIONS_PER_PAGE = 100
+
+
+'''
+QuestionCount
+    cached COUNT(*) of the questions table.
+    Reset whenever a Question is inserted or deleted through the ORM.
+'''
+
+
+class QuestionCount:
+
+    def __init__(self):
+        self._lock = Lock()
+        self._total = None
+
+    def get(self):
+        total = self._total
+
+        if total is None:
+            with self._lock:
+                if self._total is None:
+                    self._total = db.session.query(func.count(Question.id)).scalar()
+                total = self._total
+
+        return total
+
+    def invalidate(self):
+        with self._lock:
+            self._total = None
+
+
+question_count = QuestionCount()
+
+
+def _invalidate_question_count(mapper, connection, target):
+    question_count.invalidate()
+
+
+for _event_name in ("after_insert", "after_delete"):
+    event.listen(Question, _event_name, _invalidate_question_count)
+
+
+#  Helper function to read the requested page size, capped at MAX_QUESTIONS_PER_PAGE.
+#  Returns None if the value is not a positive integer (e.g. per_page=abc, which type=int would quietly
+#  turn into the default).
+def get_per_page(args, default=QUESTIONS_PER_PAGE):
+    per_page = args.get("per_page")
+
+    if per_page is None:
+        return default
+
+    try:
+        per_page = int(per_page)
+    except ValueError:
+        return None
+
+    if per_page <= 0:
+        return None
+
+    return min(per_page, MAX_QUESTIONS_PER_PAGE)
+
+
+#  Helper function to read the ?after_id= cursor; None when it is absent. Raises ValueError when it is not
+#  an integer (e.g. after_id=abc, which type=int would quietly turn into page mode).
+def get_after_id(args):
+    after_id = args.get("after_id")
+
+    return int(after_id) if after_id is not None else None
+
+
+#  Helper function to fetch a single page of questions with LIMIT/OFFSET.
+def questions_page(query, page: int, per_page: int):
+    return (
+        query
+            .order_by(Question.id)
+            .limit(per_page)
+            .offset((page - 1) * per_page)
+            .all()
+    )
+
+
+#  Helper function to fetch the questions after a cursor (keyset pagination), constant time at any depth.
+def questions_after(query, after_id: int, per_page: int):
+    return (
+        query
+            .filter(Question.id > after_id)
+            .order_by(Question.id)
+            .limit(per_page)
+            .all()
+    )
@@ -0,0 +1,128 @@
+from bisect import bisect_left, bisect_right
+from threading import Lock
+from time import monotonic
+
+from .models import db, Question
+from .response_cache import data_version
+
+QUESTION_STORE_REFRESH_INTERVAL = 5 * 60
+
+
+'''
+StoredQuestion
+    read-only copy of one questions row. __slots__ keeps it a few dozen bytes
+    and format() matches Question.format() key for key.
+'''
+
+
+class StoredQuestion:
+    __slots__ = ("id", "question", "answer", "category", "difficulty")
+
+    def __init__(self, id, question, answer, category, difficulty):
+        self.id = id
+        self.question = question
+        self.answer = answer
+        self.category = category
+        self.difficulty = difficulty
+
+    def format(self):
+        return {
+            'id': self.id,
+            'question': self.question,
+            'answer': self.answer,
+            'category': self.category,
+            'difficulty': self.difficulty
+        }
+
+
+'''
+QuestionSnapshot
+    immutable view of the whole question bank: rows ordered by id, a parallel
+    id array for bisect lookups and per-category row lists.
+'''
+
+
+class QuestionSnapshot:
+    __slots__ = ("questions", "ids", "by_category", "version", "loaded_at")
+
+    def __init__(self, questions, version):
+        self.questions = questions
+        self.ids = [question.id for question in questions]
+        self.by_category = {}
+        self.version = version
+        self.loaded_at = monotonic()
+
+        for question in questions:
+            self.by_category.setdefault(question.category, []).append(question)
+
+
+'''
+QuestionStore
+    in-process read replica of the questions table for read-mostly deployments.
+    Listing, category browsing and quiz lookups are answered from the snapshot
+    without building ORM entities. The snapshot is rebuilt with one column query
+    when a write in this process moves data_version on, or once it is older than
+    refresh_interval seconds (picking up writes made by other processes).
+'''
+
+
+class QuestionStore:
+
+    def __init__(self, refresh_interval=QUESTION_STORE_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._lock = Lock()
+        self._snapshot = None
+
+    def _is_stale(self, snapshot):
+        return (snapshot is None
+                or snapshot.version != data_version.value
+                or monotonic() - snapshot.loaded_at > self.refresh_interval)
+
+    def snapshot(self):
+        snapshot = self._snapshot
+
+        if self._is_stale(snapshot):
+            with self._lock:
+                snapshot = self._snapshot
+
+                if self._is_stale(snapshot):
+                    # Read the version first: a commit landing during the query leaves the snapshot stale
+                    version = data_version.value
+                    rows = (
+                        db.session.query(Question.id, Question.question, Question.answer, Question.category,
+                                         Question.difficulty)
+                            .order_by(Question.id)
+                    )
+                    snapshot = self._snapshot = QuestionSnapshot([StoredQuestion(*row) for row in rows], version)
+
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def count(self):
+        return len(self.snapshot().questions)
+
+    def get(self, question_id):
+        snapshot = self.snapshot()
+        position = bisect_left(snapshot.ids, question_id)
+
+        if position < len(snapshot.ids) and snapshot.ids[position] == question_id:
+            return snapshot.questions[position]
+
+        return None
+
+    def page(self, page: int, per_page: int):
+        start = (page - 1) * per_page
+
+        return self.snapshot().questions[start:start + per_page]
+
+    def after(self, after_id: int, per_page: int):
+        snapshot = self.snapshot()
+        start = bisect_right(snapshot.ids, after_id)
+
+        return snapshot.questions[start:start + per_page]
+
+    def in_category(self, category_id):
+        return list(self.snapshot().by_category.get(category_id, ()))
@@ -0,0 +1,206 @@
+from random import choice
+from threading import RLock
+
+from sqlalchemy import event
+
+from .models import db, Question
+
+ALL_CATEGORIES = 0
+ANY_DIFFICULTY = None
+DIFFICULTIES = (1, 2, 3, 4, 5)
+RANDOM_PICK_ATTEMPTS = 8
+ADAPTIVE_WINDOW = 3
+
+
+#  Helper function to normalise a category value (int, numeric string or None) to a category id.
+def category_key(category):
+    try:
+        return int(category)
+    except (TypeError, ValueError):
+        return None
+
+
+#  Helper function to list the bucket keys a question belongs to: every combination of its own
+#  category or ALL_CATEGORIES with its own difficulty or ANY_DIFFICULTY.
+def bucket_keys(category, difficulty):
+    category, difficulty = category_key(category), category_key(difficulty)
+    keys = [(ALL_CATEGORIES, ANY_DIFFICULTY), (category, ANY_DIFFICULTY)]
+
+    if difficulty is not None:
+        keys += [(ALL_CATEGORIES, difficulty), (category, difficulty)]
+
+    return keys
+
+
+'''
+QuizQuestionPool
+    per-(category, difficulty) buckets of question ids, held in memory so a quiz
+    turn never materializes the questions table. ALL_CATEGORIES (0) and
+    ANY_DIFFICULTY (None) buckets hold the union of the narrower ones.
+    Loaded on first use (ids, categories and difficulties only) and kept current
+    from Question insert and delete events; updates trigger a reload.
+'''
+
+
+class QuizQuestionPool:
+
+    def __init__(self):
+        self._lock = RLock()
+        self._ids = None
+        self._positions = None
+
+    def _add(self, key, question_id):
+        ids = self._ids.setdefault(key, [])
+        positions = self._positions.setdefault(key, {})
+
+        if question_id not in positions:
+            positions[question_id] = len(ids)
+            ids.append(question_id)
+
+    # Swap-remove keeps removal O(1)
+    def _remove(self, key, question_id):
+        positions = self._positions.get(key, {})
+        position = positions.pop(question_id, None)
+
+        if position is None:
+            return
+
+        ids = self._ids[key]
+        last_id = ids.pop()
+
+        if position < len(ids):
+            ids[position] = last_id
+            positions[last_id] = position
+
+    def _load(self):
+        with self._lock:
+            if self._ids is None:
+                self._ids = {}
+                self._positions = {}
+
+                rows = db.session.query(Question.id, Question.category, Question.difficulty)
+                for question_id, category, difficulty in rows:
+                    for key in bucket_keys(category, difficulty):
+                        self._add(key, question_id)
+
+    def add(self, question_id, category, difficulty):
+        with self._lock:
+            if self._ids is not None:
+                for key in bucket_keys(category, difficulty):
+                    self._add(key, question_id)
+
+    # Without the question's category and difficulty every bucket is checked
+    def remove(self, question_id, category=None, difficulty=None):
+        with self._lock:
+            if self._ids is not None:
+                keys = bucket_keys(category, difficulty) if category is not None else list(self._positions)
+
+                for key in keys:
+                    self._remove(key, question_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._ids = None
+            self._positions = None
+
+    # Loaded and read under one hold of the lock, so an invalidate() in between cannot empty the pool
+    def ids(self, category_id=ALL_CATEGORIES, difficulty=ANY_DIFFICULTY):
+        with self._lock:
+            self._load()
+            return list(self._ids.get((category_id, difficulty), ()))
+
+    def size(self, category_id=ALL_CATEGORIES, difficulty=ANY_DIFFICULTY):
+        with self._lock:
+            self._load()
+            return len(self._ids.get((category_id, difficulty), ()))
+
+    # Returns a random id from the bucket that is not in previous_ids, or None once the bucket is exhausted
+    def pick(self, category_id, previous_ids=frozenset(), difficulty=ANY_DIFFICULTY):
+        with self._lock:
+            self._load()
+            ids = self._ids.get((category_id, difficulty), [])
+
+            if not ids:
+                return None
+
+            for _ in range(RANDOM_PICK_ATTEMPTS):
+                question_id = choice(ids)
+                if question_id not in previous_ids:
+                    return question_id
+
+            # Most of the category has been seen: fall back to a single pass over it
+            unseen_ids = [question_id for question_id in ids if question_id not in previous_ids]
+
+        return choice(unseen_ids) if unseen_ids else None
+
+
+quiz_question_pool = QuizQuestionPool()
+
+
+def _add_to_quiz_pool(mapper, connection, target):
+    quiz_question_pool.add(target.id, target.category, target.difficulty)
+
+
+def _remove_from_quiz_pool(mapper, connection, target):
+    quiz_question_pool.remove(target.id, target.category, target.difficulty)
+
+
+def _invalidate_quiz_pool(mapper, connection, target):
+    quiz_question_pool.invalidate()
+
+
+event.listen(Question, "after_insert", _add_to_quiz_pool)
+event.listen(Question, "after_delete", _remove_from_quiz_pool)
+event.listen(Question, "after_update", _invalidate_quiz_pool)
+
+
+#  Helper function to pick the adaptive difficulty for the next turn: one step harder after
+#  ADAPTIVE_WINDOW correct answers in a row, one step easier after as many wrong ones.
+def next_difficulty(current_difficulty, recent_results):
+    recent_results = list(recent_results)[-ADAPTIVE_WINDOW:]
+
+    if len(recent_results) == ADAPTIVE_WINDOW and all(recent_results):
+        current_difficulty += 1
+    elif len(recent_results) == ADAPTIVE_WINDOW and not any(recent_results):
+        current_difficulty -= 1
+
+    return min(max(current_difficulty, DIFFICULTIES[0]), DIFFICULTIES[-1])
+
+
+#  Helper function to order the difficulties by distance from the target (ties go to the easier one).
+def nearest_difficulties(difficulty):
+    return sorted(DIFFICULTIES, key=lambda candidate: (abs(candidate - difficulty), candidate))
+
+
+#  Helper function to pick the next unseen quiz question of a category (ALL_CATEGORIES for any),
+#  optionally of one difficulty. Returns None when every matching question has already been asked.
+#  load_question fetches the picked row (the ORM by default, or a QuestionStore's get).
+def next_quiz_question(category_id, previous_ids, difficulty=ANY_DIFFICULTY, load_question=None):
+    load_question = load_question or Question.query.get
+    previous_ids = set(previous_ids)
+
+    while True:
+        question_id = quiz_question_pool.pick(category_id, previous_ids, difficulty)
+
+        if question_id is None:
+            return None
+
+        question = load_question(question_id)
+
+        if question is not None:
+            return question
+
+        # Row removed outside the ORM (e.g. a bulk delete): drop the stale id and pick again
+        quiz_question_pool.remove(question_id)
+
+
+#  Helper function to pick an unseen question as close to the target difficulty as the category allows.
+#  Returns None only when the whole category has been asked.
+def next_adaptive_quiz_question(category_id, previous_ids, difficulty, load_question=None):
+    for candidate in nearest_difficulties(difficulty):
+        question = next_quiz_question(category_id, previous_ids, candidate, load_question)
+
+        if question is not None:
+            return question
+
+    return next_quiz_question(category_id, previous_ids, load_question=load_question)
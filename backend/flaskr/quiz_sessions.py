@@ -0,0 +1,173 @@
+import json
+from collections import OrderedDict
+from random import shuffle
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+
+from .models import Question
+from .quiz import quiz_question_pool
+
+QUIZ_SESSION_TTL = 60 * 60
+QUIZ_SESSION_MAX = 10000
+
+# Pops the next question id and slides the TTL in one step. The sentinel at the head of the list is only
+# ever read, never popped: Redis deletes emptied lists, which would drop the session (and its TTL).
+_REDIS_POP_SCRIPT = """
+local length = redis.call('LLEN', KEYS[1])
+if length == 0 then
+    return false
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+if length == 1 then
+    return redis.call('LINDEX', KEYS[1], 0)
+end
+return redis.call('RPOP', KEYS[1])
+"""
+
+
+'''
+MemorySessionStore
+    bounded in-process store of quiz sessions (session id -> remaining question ids).
+    Sessions expire QUIZ_SESSION_TTL seconds after their last use, and the least
+    recently used session is evicted once QUIZ_SESSION_MAX sessions are held.
+'''
+
+
+class MemorySessionStore:
+
+    def __init__(self, ttl=QUIZ_SESSION_TTL, max_sessions=QUIZ_SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = Lock()
+        self._sessions = OrderedDict()
+
+    def _expire(self, now):
+        while self._sessions:
+            session_id, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[session_id]
+
+    def create(self, session_id, question_ids):
+        now = monotonic()
+
+        with self._lock:
+            self._expire(now)
+            self._sessions[session_id] = (now + self.ttl, list(question_ids))
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    # Returns the next question id (None once exhausted), or raises KeyError for an unknown or expired session
+    def pop(self, session_id):
+        now = monotonic()
+
+        with self._lock:
+            self._expire(now)
+            _, question_ids = self._sessions[session_id]
+
+            self._sessions[session_id] = (now + self.ttl, question_ids)
+            self._sessions.move_to_end(session_id)
+
+            return question_ids.pop() if question_ids else None
+
+    def remaining(self, session_id):
+        with self._lock:
+            return len(self._sessions[session_id][1])
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+'''
+RedisSessionStore
+    quiz sessions in any Redis-compatible server, shared by every worker process.
+    Each session is a list of question ids with a sliding TTL; eviction beyond
+    that is left to the server's maxmemory-policy (e.g. allkeys-lru).
+'''
+
+
+class RedisSessionStore:
+
+    def __init__(self, url, ttl=QUIZ_SESSION_TTL, prefix="trivia:quiz:", client=None):
+        if client is None:
+            # Imported on demand: optional, and only needed for QUIZ_SESSION_STORE=redis
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("QUIZ_SESSION_STORE=redis requires the 'redis' package")
+
+            client = redis.Redis.from_url(url)
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = client
+        self._pop = client.register_script(_REDIS_POP_SCRIPT)
+
+    def create(self, session_id, question_ids):
+        key = self.prefix + session_id
+        pipeline = self._client.pipeline()
+        pipeline.delete(key)
+        # Sentinel keeps the key alive (and known) after the last question has been popped
+        pipeline.rpush(key, json.dumps(None), *question_ids)
+        pipeline.expire(key, self.ttl)
+        pipeline.execute()
+
+    def pop(self, session_id):
+        value = self._pop(keys=[self.prefix + session_id], args=[self.ttl])
+
+        if value is None:
+            raise KeyError(session_id)
+
+        return json.loads(value)
+
+    def remaining(self, session_id):
+        length = self._client.llen(self.prefix + session_id)
+
+        if not length:
+            raise KeyError(session_id)
+
+        return length - 1
+
+    def delete(self, session_id):
+        return bool(self._client.delete(self.prefix + session_id))
+
+
+#  Helper function to build the session store selected by QUIZ_SESSION_STORE ("memory" or "redis").
+def make_session_store(config):
+    ttl = int(config.get("QUIZ_SESSION_TTL", QUIZ_SESSION_TTL))
+
+    if config.get("QUIZ_SESSION_STORE", "memory") == "redis":
+        return RedisSessionStore(config.get("QUIZ_SESSION_REDIS_URL", "redis://localhost:6379/0"), ttl)
+
+    return MemorySessionStore(ttl, int(config.get("QUIZ_SESSION_MAX", QUIZ_SESSION_MAX)))
+
+
+#  Helper function to start a quiz session over a pre-shuffled copy of the category's question ids.
+#  Returns (session id, number of questions in the session).
+def start_quiz_session(store, category_id):
+    question_ids = quiz_question_pool.ids(category_id)
+    shuffle(question_ids)
+
+    session_id = uuid4().hex
+    store.create(session_id, question_ids)
+
+    return session_id, len(question_ids)
+
+
+#  Helper function to pop the session's next question. Returns None once the session is exhausted;
+#  raises KeyError for an unknown or expired session.
+def next_session_question(store, session_id):
+    while True:
+        question_id = store.pop(session_id)
+
+        if question_id is None:
+            return None
+
+        question = Question.query.get(int(question_id))
+
+        # Skip questions deleted since the session started
+        if question is not None:
+            return question
@@ -0,0 +1,94 @@
+from threading import Lock
+from time import time
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+REPLICA_BIND = "replica"
+READ_YOUR_WRITES_WINDOW = 5
+LAST_WRITE_COOKIE = "trivia_last_write"
+
+
+'''
+RoutingSession
+    session that sends the reads of a request marked g.read_from_replica to the
+    "replica" bind. Flushes, INSERT/UPDATE/DELETE statements and raw SQL always
+    go to the primary.
+'''
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if reading_from_replica() and not self._flushing and not isinstance(clause, (UpdateBase, TextClause)):
+            app = current_app._get_current_object()
+
+            if REPLICA_BIND in (app.config.get("SQLALCHEMY_BINDS") or {}):
+                return self.db.get_engine(app, bind=REPLICA_BIND)
+
+        return super().get_bind(mapper, clause)
+
+
+'''
+RoutingSQLAlchemy
+    Flask-SQLAlchemy whose sessions route reads with RoutingSession.
+'''
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+#  Helper function to tell whether the current request's reads may go to the replica.
+def reading_from_replica():
+    return has_app_context() and g.get("read_from_replica", False)
+
+
+'''
+ReplicaRouter
+    decides per request whether reads go to the replica. Reads stay on the
+    primary for READ_YOUR_WRITES_WINDOW seconds after a write by the same client
+    (tracked with a cookie) or by this process (so caches rebuilt after a write
+    never load rows the replica has not caught up with yet).
+'''
+
+
+class ReplicaRouter:
+
+    def __init__(self, window=READ_YOUR_WRITES_WINDOW):
+        self.window = window
+        self._lock = Lock()
+        self._last_write = 0.0
+
+    def record_write(self):
+        with self._lock:
+            self._last_write = time()
+
+    def use_replica(self, request):
+        now = time()
+
+        if now - self._last_write < self.window:
+            return False
+
+        try:
+            client_last_write = float(request.cookies.get(LAST_WRITE_COOKIE, 0))
+        except ValueError:
+            client_last_write = 0.0
+
+        return now - client_last_write >= self.window
+
+    # Remembers the write on the response so the client's next reads within the window go to the primary
+    def mark_response(self, response):
+        if self.window > 0:
+            response.set_cookie(LAST_WRITE_COOKIE, str(time()), max_age=self.window, httponly=True)
+
+        return response
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+from time import monotonic
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .models import Question, Category
+
+RESPONSE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+RESPONSE_CACHE_MAX_AGE = 0
+RESPONSE_CACHE_MAX_ENTRY_AGE = 60
+
+
+'''
+DataVersion
+    counter bumped after every commit that wrote a Question or Category.
+    Cached responses remember the version they were built at and are
+    discarded once it moves on.
+'''
+
+
+class DataVersion:
+
+    def __init__(self):
+        self._lock = Lock()
+        self.value = 0
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+
+
+data_version = DataVersion()
+
+_VERSIONED_MODELS = (Question, Category)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_versioned_writes(session, flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, _VERSIONED_MODELS):
+            session.info["data_changed"] = True
+            break
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_data_version(session):
+    if session.info.pop("data_changed", False):
+        data_version.bump()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_versioned_writes(session, previous_transaction):
+    session.info.pop("data_changed", None)
+
+
+'''
+ResponseCache
+    LRU cache of serialized GET responses keyed on path, query args and
+    response format, bounded by the total size of the cached bodies
+    (compressed copies included). Entries are dropped once data_version moves
+    on, or after max_entry_age seconds to pick up changes made to the
+    database outside the app.
+'''
+
+
+class ResponseCache:
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES, max_entry_age=RESPONSE_CACHE_MAX_ENTRY_AGE):
+        self.max_bytes = max_bytes
+        self.max_entry_age = max_entry_age
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry["version"] != version or monotonic() - entry["stored_at"] > self.max_entry_age:
+                self._discard(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, version, body, mimetype):
+        if len(body) > self.max_bytes:
+            return None
+
+        entry = {
+            "version": version,
+            "body": body,
+            "mimetype": mimetype,
+            "etag": sha1(body).hexdigest(),
+            "encoded": {},
+            "stored_at": monotonic(),
+        }
+
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = entry
+            self._size += len(body)
+
+            while self._size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+        return entry
+
+    # The entry's body in a Content-Encoding, compressed with compress on first use and kept with the entry
+    def encoded_body(self, key, entry, encoding, compress):
+        body = entry["encoded"].get(encoding)
+
+        if body is not None:
+            return body
+
+        body = compress(entry["body"])
+
+        with self._lock:
+            # Only counted while the entry is still cached; an evicted entry's copy goes with it
+            if self._entries.get(key) is entry and encoding not in entry["encoded"]:
+                entry["encoded"][encoding] = body
+                self._size += len(body)
+
+                while self._size > self.max_bytes:
+                    self._discard(next(iter(self._entries)))
+
+        return body
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+
+        if entry is not None:
+            self._size -= len(entry["body"]) + sum(len(body) for body in entry["encoded"].values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+#  Helper function to build the cache key for the current request: path, sorted query args and the
+#  negotiated response mimetype.
+def cache_key(request, mimetype):
+    return request.path, tuple(sorted(request.args.items(multi=True))), mimetype
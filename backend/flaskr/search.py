@@ -0,0 +1,199 @@
+from threading import RLock
+
+from sqlalchemy import case, event, func, or_
+
+from .models import db, Question
+from .pagination import question_count, questions_page
+from .streaming import QUESTION_COLUMNS, STREAM_BATCH_SIZE, question_rows
+
+SEARCH_BACKENDS = ("auto", "database", "memory")
+
+
+#  Helper function to split lowercased text into its set of character trigrams.
+def trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+'''
+TrigramIndex
+    in-process inverted index (trigram -> question ids) over question and answer text.
+    Used where the database has no trigram index of its own (e.g. SQLite in tests).
+    Built from the questions table on first use and kept current from Question
+    insert, update and delete events.
+'''
+
+
+class TrigramIndex:
+
+    def __init__(self):
+        self._lock = RLock()
+        self._postings = None
+        self._documents = None
+
+    def _add(self, question_id, question, answer):
+        document = ((question or "").lower(), (answer or "").lower())
+        self._documents[question_id] = document
+
+        for gram in trigrams(document[0]) | trigrams(document[1]):
+            self._postings.setdefault(gram, set()).add(question_id)
+
+    def _remove(self, question_id):
+        document = self._documents.pop(question_id, None)
+
+        if document is None:
+            return
+
+        for gram in trigrams(document[0]) | trigrams(document[1]):
+            postings = self._postings.get(gram)
+
+            if postings is not None:
+                postings.discard(question_id)
+
+                if not postings:
+                    del self._postings[gram]
+
+    def _load(self):
+        with self._lock:
+            if self._documents is None:
+                self._postings = {}
+                self._documents = {}
+
+                rows = db.session.query(Question.id, Question.question, Question.answer)
+                for question_id, question, answer in rows:
+                    self._add(question_id, question, answer)
+
+    def index(self, question):
+        with self._lock:
+            if self._documents is not None:
+                self._remove(question.id)
+                self._add(question.id, question.question, question.answer)
+
+    def unindex(self, question_id):
+        with self._lock:
+            if self._documents is not None:
+                self._remove(question_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+            self._documents = None
+
+    # Returns every matching id, ranked: question-text matches first, then shorter (closer) texts, then id
+    def search(self, term: str):
+        term = term.lower()
+
+        # Loaded and read under one hold of the lock, so an invalidate() in between cannot empty the index
+        with self._lock:
+            self._load()
+            grams = trigrams(term)
+
+            if grams:
+                postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                candidates = self._documents.keys()
+
+            ranked = []
+            for question_id in candidates:
+                question, answer = self._documents[question_id]
+
+                if term in question:
+                    ranked.append((0, len(question), question_id))
+                elif term in answer:
+                    ranked.append((1, len(answer), question_id))
+
+        ranked.sort()
+
+        return [question_id for _, _, question_id in ranked]
+
+
+trigram_index = TrigramIndex()
+
+
+def _index_question(mapper, connection, target):
+    trigram_index.index(target)
+
+
+def _unindex_question(mapper, connection, target):
+    trigram_index.unindex(target.id)
+
+
+event.listen(Question, "after_insert", _index_question)
+event.listen(Question, "after_update", _index_question)
+event.listen(Question, "after_delete", _unindex_question)
+
+
+#  Helper function to decide whether the database can serve the search itself.
+#  "auto" uses the database on Postgres (backed by the pg_trgm GIN indexes from migrations/) and
+#  the in-process trigram index everywhere else.
+def use_database_search(backend: str = "auto"):
+    if backend == "database":
+        return True
+    if backend == "memory":
+        return False
+
+    return db.engine.dialect.name == "postgresql"
+
+
+def _ilike_matches(term):
+    search_pattern = "%{}%".format(term)
+    criteria = or_(Question.question.ilike(search_pattern), Question.answer.ilike(search_pattern))
+    ranking = (case([(Question.question.ilike(search_pattern), 0)], else_=1),
+               func.length(Question.question),
+               Question.id)
+
+    return criteria, ranking
+
+
+#  Helper function to search question and answer text, returning (page of questions, total matches).
+#  A blank term pages through every question.
+def search_questions(term, page: int, per_page: int, backend: str = "auto"):
+    if term == '' or term is None:
+        return questions_page(Question.query, page, per_page), question_count.get()
+
+    if use_database_search(backend):
+        criteria, ranking = _ilike_matches(term)
+        matches = Question.query.filter(criteria)
+        total = matches.with_entities(func.count(Question.id)).scalar()
+        ranked = (
+            matches
+                .order_by(*ranking)
+                .limit(per_page)
+                .offset((page - 1) * per_page)
+                .all()
+        )
+
+        return ranked, total
+
+    ranked_ids = trigram_index.search(term)
+    page_ids = ranked_ids[(page - 1) * per_page:page * per_page]
+
+    if not page_ids:
+        return [], len(ranked_ids)
+
+    questions_by_id = {question.id: question for question in Question.query.filter(Question.id.in_(page_ids))}
+
+    return [questions_by_id[question_id] for question_id in page_ids if question_id in questions_by_id], len(ranked_ids)
+
+
+#  Helper function to yield every match as a plain column row, in rank order, without building ORM entities.
+#  A blank term yields every question.
+def search_question_rows(term, backend: str = "auto"):
+    if term == '' or term is None:
+        yield from question_rows()
+        return
+
+    if use_database_search(backend):
+        criteria, ranking = _ilike_matches(term)
+        yield from question_rows(criteria, order_by=ranking)
+        return
+
+    ranked_ids = trigram_index.search(term)
+
+    for start in range(0, len(ranked_ids), STREAM_BATCH_SIZE):
+        batch_ids = ranked_ids[start:start + STREAM_BATCH_SIZE]
+        rows_by_id = {row[0]: row for row in db.session.query(*QUESTION_COLUMNS).filter(Question.id.in_(batch_ids))}
+
+        for question_id in batch_ids:
+            if question_id in rows_by_id:
+                yield rows_by_id[question_id]
@@ -0,0 +1,143 @@
+import sys
+from threading import Lock
+from time import monotonic
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .category_registry import category_registry
+from .json_fragments import clear_question_fragments
+from .models import db, Question, Category, SharedDataVersion
+from .pagination import question_count
+from .quiz import quiz_question_pool
+from .response_cache import data_version
+from .search import trigram_index
+from .suggest import prefix_index
+
+SHARED_VERSION_POLL_INTERVAL = 1.0
+
+shared_versions_table = SharedDataVersion.__table__
+_SHARED_VERSION_ROW = shared_versions_table.c.id == 1
+_VERSIONED_MODELS = (Question, Category)
+
+
+#  Helper function to drop every in-process structure built from the questions and categories tables.
+def drop_local_caches():
+    category_registry.invalidate()
+    question_count.invalidate()
+    trigram_index.invalidate()
+    prefix_index.invalidate()
+    quiz_question_pool.invalidate()
+    clear_question_fragments()
+    data_version.bump()
+
+
+#  Helper function to bump the shared version inside the session's transaction, so other processes see
+#  it together with the write. Remembers the new value until the commit. Does nothing on a database
+#  without the data_versions table.
+def bump_shared_version(session):
+    if not shared_version_poller.enabled(session):
+        return
+
+    session.execute(shared_versions_table.update().where(_SHARED_VERSION_ROW)
+                    .values(version=shared_versions_table.c.version + 1))
+    session.info["shared_version"] = session.execute(
+        select([shared_versions_table.c.version]).where(_SHARED_VERSION_ROW)).scalar()
+
+
+'''
+SharedVersionPoller
+    notices writes made by other worker processes. At most once per interval
+    it reads the shared version; when the version has moved on without this
+    process writing, every in-process cache is dropped and rebuilt from the
+    database on next use. This process's own writes already keep its caches
+    current, so they only move the last seen version along.
+    On a database without the data_versions table (migrations/005 not applied)
+    sharing is switched off for the life of the process: reads and writes go
+    on as before, and the caches stay per process.
+'''
+
+
+class SharedVersionPoller:
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._checked_at = None
+        self._enabled = None
+
+    # Whether the data_versions table exists, checked once per process on the session's own connection
+    def enabled(self, session):
+        if self._enabled is None:
+            enabled = session.get_bind().dialect.has_table(session.connection(), shared_versions_table.name)
+
+            if not enabled:
+                print("No data_versions table: caches are not shared between worker processes. "
+                      "Apply migrations/005_data_versions.sql (or run `flask db-init`) and restart.")
+
+            self._enabled = enabled
+
+        return self._enabled
+
+    # Returns True when another process's write was found (and the caches were dropped)
+    def poll(self, interval=SHARED_VERSION_POLL_INTERVAL):
+        now = monotonic()
+
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < interval:
+                return False
+            self._checked_at = now
+
+        try:
+            if not self.enabled(db.session):
+                return False
+
+            version = db.session.execute(select([shared_versions_table.c.version])
+                                         .where(_SHARED_VERSION_ROW)).scalar()
+        except SQLAlchemyError:
+            # E.g. the database is briefly unreachable: the request goes on, the next poll tries again
+            db.session.rollback()
+            print(sys.exc_info())
+            return False
+
+        with self._lock:
+            changed = self._version is not None and version != self._version
+            self._version = version
+
+        if changed:
+            drop_local_caches()
+
+        return changed
+
+    def record_own_write(self, version):
+        with self._lock:
+            if self._version is not None and version == self._version + 1:
+                self._version = version
+
+
+shared_version_poller = SharedVersionPoller()
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_on_versioned_writes(session, flush_context):
+    if "shared_version" in session.info:
+        return
+
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, _VERSIONED_MODELS):
+            bump_shared_version(session)
+            break
+
+
+@event.listens_for(Session, "after_commit")
+def _record_shared_version(session):
+    version = session.info.pop("shared_version", None)
+
+    if version is not None:
+        shared_version_poller.record_own_write(version)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_shared_version(session, previous_transaction):
+    session.info.pop("shared_version", None)
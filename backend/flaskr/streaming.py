@@ -0,0 +1,55 @@
+import json
+
+from .models import db, Question
+
+STREAM_BATCH_SIZE = 1000
+STREAM_CHUNK_BYTES = 64 * 1024
+
+QUESTION_COLUMNS = (Question.id, Question.question, Question.answer, Question.category, Question.difficulty)
+
+
+#  Helper function to query question rows as plain column tuples through a server-side cursor,
+#  so no ORM entities are built and only STREAM_BATCH_SIZE rows are held at a time.
+def question_rows(*criteria, order_by=(Question.id,), batch_size: int = STREAM_BATCH_SIZE):
+    return (
+        db.session
+            .query(*QUESTION_COLUMNS)
+            .filter(*criteria)
+            .order_by(*order_by)
+            .execution_options(stream_results=True)
+            .yield_per(batch_size)
+    )
+
+
+#  Helper function to turn a question row into the same dict as Question.format().
+def format_question_row(row):
+    question_id, question, answer, category, difficulty = row
+
+    return {
+        'id': question_id,
+        'question': question,
+        'answer': answer,
+        'category': category,
+        'difficulty': difficulty
+    }
+
+
+#  Helper function to emit a questions response as a JSON document in ~STREAM_CHUNK_BYTES chunks.
+#  total_questions is counted while streaming and written after the array.
+def stream_questions_json(rows, current_category=None):
+    chunk = ['{{"current_category":{},"questions":['.format(json.dumps(current_category))]
+    chunk_size = 0
+    total_questions = 0
+
+    for row in rows:
+        encoded = ("," if total_questions else "") + json.dumps(format_question_row(row), separators=(",", ":"))
+        chunk.append(encoded)
+        chunk_size += len(encoded)
+        total_questions += 1
+
+        if chunk_size >= STREAM_CHUNK_BYTES:
+            yield "".join(chunk)
+            chunk, chunk_size = [], 0
+
+    chunk.append('],"total_questions":{},"success":true}}\n'.format(total_questions))
+    yield "".join(chunk)
@@ -0,0 +1,137 @@
+import re
+from bisect import bisect_left, insort
+from threading import RLock
+
+from sqlalchemy import event
+
+from .models import db, Question
+
+SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+MIN_TERM_LENGTH = 2
+
+# Sorts after every character a question or term can contain, so (prefix, END) bounds a prefix range
+_END = "\U0010ffff"
+
+
+#  Helper function to split question text into its distinct lowercase words.
+def question_terms(text):
+    return {term for term in re.findall(r"\w+", (text or "").lower()) if len(term) >= MIN_TERM_LENGTH}
+
+
+'''
+PrefixIndex
+    sorted arrays of (lowercased question text, id) and of distinct question
+    words, searched with bisect for autocompletion. Built from the questions
+    table on first use and kept current from Question insert, update and delete
+    events; term counts drop a word once no question uses it.
+'''
+
+
+class PrefixIndex:
+
+    def __init__(self):
+        self._lock = RLock()
+        self._questions = None
+        self._terms = None
+        self._term_counts = None
+        self._texts = None
+
+    def _add(self, question_id, text):
+        text = text or ""
+        self._texts[question_id] = text
+        insort(self._questions, (text.lower(), question_id))
+
+        for term in question_terms(text):
+            count = self._term_counts.get(term, 0)
+            self._term_counts[term] = count + 1
+
+            if not count:
+                insort(self._terms, term)
+
+    def _remove(self, question_id):
+        text = self._texts.pop(question_id, None)
+
+        if text is None:
+            return
+
+        entry = (text.lower(), question_id)
+        position = bisect_left(self._questions, entry)
+
+        if position < len(self._questions) and self._questions[position] == entry:
+            del self._questions[position]
+
+        for term in question_terms(text):
+            count = self._term_counts.pop(term, 0) - 1
+
+            if count > 0:
+                self._term_counts[term] = count
+            else:
+                del self._terms[bisect_left(self._terms, term)]
+
+    def _load(self):
+        with self._lock:
+            if self._questions is None:
+                self._questions, self._terms, self._term_counts, self._texts = [], [], {}, {}
+
+                for question_id, text in db.session.query(Question.id, Question.question):
+                    self._texts[question_id] = text or ""
+                    self._questions.append(((text or "").lower(), question_id))
+
+                    for term in question_terms(text):
+                        self._term_counts[term] = self._term_counts.get(term, 0) + 1
+
+                self._questions.sort()
+                self._terms = sorted(self._term_counts)
+
+    def index(self, question_id, text):
+        with self._lock:
+            if self._questions is not None:
+                self._remove(question_id)
+                self._add(question_id, text)
+
+    def remove(self, question_id):
+        with self._lock:
+            if self._questions is not None:
+                self._remove(question_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._questions, self._terms, self._term_counts, self._texts = None, None, None, None
+
+    # Returns up to `limit` (id, question text) pairs whose text starts with prefix, and up to `limit` words
+    # starting with it, both in alphabetical order
+    def suggest(self, prefix, limit=SUGGESTIONS):
+        prefix = prefix.lower()
+
+        # Loaded and read under one hold of the lock, so an invalidate() in between cannot empty the index
+        with self._lock:
+            self._load()
+            start = bisect_left(self._questions, (prefix,))
+            end = min(start + limit, bisect_left(self._questions, (prefix + _END,)))
+            questions = [(question_id, self._texts[question_id]) for _, question_id in self._questions[start:end]]
+
+            # Only the last word is being typed: complete it on its own. After a trailing space the next word
+            # has not been started, so there is none to complete
+            last_word = prefix.rsplit(None, 1)[-1] if prefix and not prefix[-1].isspace() else ""
+            start = bisect_left(self._terms, last_word)
+            end = min(start + limit, bisect_left(self._terms, last_word + _END))
+            terms = self._terms[start:end] if last_word else []
+
+        return questions, terms
+
+
+prefix_index = PrefixIndex()
+
+
+def _index_question_prefixes(mapper, connection, target):
+    prefix_index.index(target.id, target.question)
+
+
+def _remove_question_prefixes(mapper, connection, target):
+    prefix_index.remove(target.id)
+
+
+event.listen(Question, "after_insert", _index_question_prefixes)
+event.listen(Question, "after_update", _index_question_prefixes)
+event.listen(Question, "after_delete", _remove_question_prefixes)
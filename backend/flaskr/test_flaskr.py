@@ -1,22 +1,67 @@
+import gzip
 import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine
 
 from . import create_app, CODE
-from .models import setup_db, Question
+from .db_pool import InstrumentedQueuePool, pool_metrics
+from .find_category_type import find_category_type
+from .jobs import JobQueue
+from .models import setup_db, Question, Category, Job, db
+from .quiz import quiz_question_pool
+from .quiz_sessions import RedisSessionStore
+from .replica import REPLICA_BIND
+from .search import trigram_index
+from .shared_version import drop_local_caches, shared_version_poller
+from .suggest import prefix_index
+from .testing import RolledBackTransaction, database_url_for_tests, enable_sqlite_savepoints, load_fixtures
+
+# Optional: MessagePack responses are only tested where the package is installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# The schema comes from the fixtures below, not from create_app
+os.environ.setdefault("DB_CREATE_ALL", "false")
+# Background jobs run inline, inside each test's transaction
+os.environ.setdefault("JOB_QUEUE_WORKERS", "0")
 
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
+    @classmethod
+    def setUpClass(cls):
+        """Create the app and load the trivia.psql fixtures once for the whole test case."""
+        enable_sqlite_savepoints()
+
+        cls.app = create_app()
+        cls.database_path = database_url_for_tests()
+        setup_db(cls.app, cls.database_path)
+
+        with cls.app.app_context():
+            load_fixtures()
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
     def setUp(self):
-        """Define test variables and initialize app."""
-        self.app = create_app()
+        """Define test variables and open the transaction the test runs in."""
         self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
+        self.transaction = RolledBackTransaction(self.app)
+        self.transaction.start()
 
         # Create and insert dummy question into db
         new_question = Question(
@@ -27,16 +72,9 @@ class TriviaTestCase(unittest.TestCase):
         )
         new_question.insert()
 
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-
     def tearDown(self):
-        """Executed after reach test"""
-        pass
+        """Executed after reach test: roll back everything the test wrote"""
+        self.transaction.rollback()
 
     # GET '/categories' endpoint (200)
     def test_200_for_get_categories(self):
@@ -50,6 +88,52 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(len(data["categories"]))
         self.assertEqual(data['total_categories'] > 0, True)
 
+    # GET '/categories' endpoint (200) (served from the category registry)
+    def test_200_for_get_categories_from_registry(self):
+        """GET '/categories' endpoint (200) (served from the category registry)"""
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+
+        with self.app.app_context():
+            category_types = [category.type for category in Category.query.order_by(Category.id).all()]
+
+            self.assertEqual(find_category_type(1), category_types[0])
+            self.assertEqual(find_category_type("1"), category_types[0])
+            self.assertEqual(find_category_type(-1), None)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["categories"], category_types)
+
+    # GET '/categories/stats' endpoint (200)
+    def test_200_for_get_category_stats(self):
+        """GET '/categories/stats' endpoint (200)"""
+        before = json.loads(self.client().get('/categories/stats').data)
+        self.client().post('/questions', json={"question": "How many questions are in Science?",
+                                               "answer": "One more than before", "category": 1, "difficulty": 5})
+        res = self.client().get('/categories/stats')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["total_questions"], len(Question.query.all()))
+        self.assertEqual(data["categories"][0]["total_questions"], before["categories"][0]["total_questions"] + 1)
+        self.assertEqual(data["categories"][0]["difficulties"].get("5"),
+                         before["categories"][0]["difficulties"].get("5", 0) + 1)
+
+    # GET '/categories/stats' endpoint (200) (empty aggregate)
+    def test_200_for_get_category_stats_without_backfill(self):
+        """GET '/categories/stats' endpoint (200) (empty aggregate)"""
+        with self.app.app_context():
+            db.session.execute("DELETE FROM category_stats")
+            drop_local_caches()
+
+        res = self.client().get('/categories/stats')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["total_questions"], 0)
+        # The read does not backfill the aggregate: that is left to `flask db-init` (or migration 003)
+        self.assertEqual(db.session.execute("SELECT COUNT(*) FROM category_stats").scalar(), 0)
+
     # GET '/questions' endpoint (200) (1st)
     def test_200_for_get_questions_I(self):
         """GET '/questions' endpoint (200) (1st)"""
@@ -79,6 +163,90 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], True)
         self.assertTrue(len(data['questions']) >= 1)  # Page exists, thus should have at least 1 question
 
+    # GET '/questions' endpoint (200) (per_page)
+    def test_200_for_get_questions_per_page(self):
+        """GET '/questions' endpoint (200) (per_page)"""
+        res = self.client().get('/questions?page=1&per_page=5')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["per_page"], 5)
+        self.assertEqual(len(data['questions']), 5)
+
+    # GET '/questions' endpoint (200) (after_id cursor)
+    def test_200_for_get_questions_after_id(self):
+        """GET '/questions' endpoint (200) (after_id cursor)"""
+        first_page = json.loads(self.client().get('/questions?after_id=0&per_page=2').data)
+        res = self.client().get('/questions?after_id={}&per_page=2'.format(first_page["next_after_id"]))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(len(first_page['questions']), 2)
+        self.assertTrue(all(question["id"] > first_page["next_after_id"] for question in data['questions']))
+
+    # GET '/questions' endpoint (400) (per_page)
+    def test_400_for_get_questions_per_page(self):
+        """GET '/questions' endpoint (400) (per_page)"""
+        res = self.client().get('/questions?per_page=0')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["400_BAD_REQUEST"])
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "Bad request")
+
+    # GET '/questions' endpoint (400) (after_id not an integer)
+    def test_400_for_get_questions_after_id_not_integer(self):
+        """GET '/questions' endpoint (400) (after_id not an integer)"""
+        res = self.client().get('/questions?after_id=abc')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["400_BAD_REQUEST"])
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "Bad request")
+
+    # GET '/questions' endpoint (400) (per_page not an integer)
+    def test_400_for_get_questions_per_page_not_integer(self):
+        """GET '/questions' endpoint (400) (per_page not an integer)"""
+        res = self.client().get('/questions?per_page=abc')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["400_BAD_REQUEST"])
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "Bad request")
+
+    # GET '/questions' endpoint (304) (conditional GET)
+    def test_304_for_get_questions_if_none_match(self):
+        """GET '/questions' endpoint (304) (conditional GET)"""
+        first_res = self.client().get('/questions?page=1')
+        res = self.client().get('/questions?page=1', headers={"If-None-Match": first_res.headers["ETag"]})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers["ETag"], first_res.headers["ETag"])
+
+        # A write moves the data version on, so the old ETag no longer matches
+        self.client().post('/questions', json={"question": "Is this cached?", "answer": "Not any more",
+                                               "category": 1, "difficulty": 1})
+        res = self.client().get('/questions?page=1', headers={"If-None-Match": first_res.headers["ETag"]})
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+
+    # GET '/categories/<id>/questions' endpoint (200) (cached entry expired)
+    def test_200_for_get_questions_by_category_cache_expired(self):
+        """GET '/categories/<id>/questions' endpoint (200) (cached entry expired)"""
+        app = create_app({"RESPONSE_CACHE_MAX_ENTRY_AGE": 0})
+        setup_db(app, self.database_path)
+        client = app.test_client()
+        before = json.loads(client.get('/categories/1/questions').data)
+
+        # Written outside the app: no event or version bump reaches the response cache
+        db.session.execute(Question.__table__.insert(), {"question": "Edited with psql?", "answer": "Yes",
+                                                         "category": 1, "difficulty": 1})
+        db.session.commit()
+
+        data = json.loads(client.get('/categories/1/questions').data)
+
+        self.assertEqual(len(data["questions"]), len(before["questions"]) + 1)
+
     # GET '/questions' endpoint (404) (1st)
     def test_404_for_get_questions_I(self):
         """GET '/questions' endpoint (404) (1st)"""
@@ -130,6 +298,54 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, CODE["200_OK"])
         self.assertEqual(data["success"], True)
 
+    # DELETE '/questions' endpoint (200) (batch)
+    def test_200_for_batch_delete_questions(self):
+        """DELETE '/questions' endpoint (200) (batch)"""
+        question_ids = [question.id for question in Question.query.order_by(Question.id).limit(2).all()]
+        res = self.client().delete('/questions', json={"ids": question_ids + [77777]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["deleted"], question_ids)
+        self.assertEqual(data["not_found"], [77777])
+        self.assertEqual(Question.query.filter(Question.id.in_(question_ids)).count(), 0)
+
+    # DELETE '/questions' endpoint (400) (batch)
+    def test_400_for_batch_delete_questions(self):
+        """DELETE '/questions' endpoint (400) (batch)"""
+        res = self.client().delete('/questions', json={"ids": []})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["400_BAD_REQUEST"])
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "Bad request")
+
+    # PATCH '/questions' endpoint (200) (batch)
+    def test_200_for_batch_update_questions(self):
+        """PATCH '/questions' endpoint (200) (batch)"""
+        first, second = Question.query.order_by(Question.id).limit(2).all()
+        res = self.client().patch('/questions', json={"questions": [{"id": first.id, "answer": "Updated answer"},
+                                                                    {"id": second.id, "difficulty": 5}]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["updated"], sorted([first.id, second.id]))
+        self.assertEqual(data["total_updated"], 2)
+
+        db.session.expire_all()
+        self.assertEqual(Question.query.get(first.id).answer, "Updated answer")
+        self.assertEqual(Question.query.get(second.id).difficulty, 5)
+
+    # PATCH '/questions' endpoint (422) (batch)
+    def test_422_for_batch_update_questions(self):
+        """PATCH '/questions' endpoint (422) (batch)"""
+        res = self.client().patch('/questions', json={"questions": [{"id": 1, "difficulty": 9}]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["422_UNPROCESSABLE_ENTITY"])
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "Unprocessable entity")
+
     # POST '/questions' endpoint (200)
     def test_200_for_post_question(self):
         """POST '/questions' endpoint (200)"""
@@ -140,6 +356,54 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, CODE["200_OK"])
         self.assertEqual(data["success"], True)
 
+    # POST '/questions' endpoint (422)
+    def test_422_for_post_question_unknown_category(self):
+        """POST '/questions' endpoint (422)"""
+        res = self.client().post('/questions', json={"question": "Which category is this in?", "answer": "None",
+                                                     "category": 77777, "difficulty": 1})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["422_UNPROCESSABLE_ENTITY"])
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "Unprocessable entity")
+
+    # POST '/questions/bulk' endpoint (200)
+    def test_200_for_bulk_import_questions(self):
+        """POST '/questions/bulk' endpoint (200)"""
+        rows = [
+            {"question": "Bulk question one?", "answer": "One", "category": 1, "difficulty": 1},
+            {"question": "", "answer": "No question", "category": 1, "difficulty": 1},
+            {"question": "Bulk question two?", "answer": "Two", "category": 1, "difficulty": 2},
+        ]
+        res = self.client().post('/questions/bulk', data="\n".join(json.dumps(row) for row in rows),
+                                 content_type="application/x-ndjson")
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["inserted"], 2)
+        self.assertEqual(data["rejected"], 1)
+        self.assertEqual(data["errors"][0]["line"], 2)
+
+    # POST '/questions/bulk' endpoint (400)
+    def test_400_for_bulk_import_questions(self):
+        """POST '/questions/bulk' endpoint (400)"""
+        res = self.client().post('/questions/bulk', json=[{"question": "Not a stream"}])
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["400_BAD_REQUEST"])
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "Bad request")
+
+    # GET '/questions/export' endpoint (200)
+    def test_200_for_export_questions(self):
+        """GET '/questions/export' endpoint (200)"""
+        res = self.client().get('/questions/export?format=csv')
+        lines = res.data.decode("utf-8").splitlines()
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(lines[0], "id,question,answer,category,difficulty")
+        self.assertEqual(len(lines) - 1, len(Question.query.all()))
+
     # POST '/questions' endpoint (405)
     def test_405_for_post_question(self):
         """POST '/questions' endpoint (405)"""
@@ -175,6 +439,8 @@ class TriviaTestCase(unittest.TestCase):
     # POST '/search' endpoint (200) (1st)
     def test_200_for_post_question_search_I(self):
         """POST '/search' endpoint (200) (1st)"""
+        Question(question="Who is afraid of Virginia Woolf?", answer="George and Martha", category=5,
+                 difficulty=2).insert()
         res = self.client().post('/search', json={"searchTerm": "afraid"})  # A question matching "afraid" exists
         data = json.loads(res.data)
 
@@ -204,6 +470,37 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertEqual(data['total_questions'], total_questions)
 
+    # POST '/search' endpoint (200) (4th)
+    def test_200_for_post_question_search_IV(self):
+        """POST '/search' endpoint (200) (4th)"""
+        res = self.client().post('/search', json={"searchTerm": "7 8 9"})  # Matches the dummy question's answer
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['total_questions'] >= 1)
+        self.assertTrue(all("7 8 9" in question["answer"] for question in data['questions']))
+
+    # POST '/search' endpoint (200) (5th)
+    def test_200_for_post_question_search_V(self):
+        """POST '/search' endpoint (200) (5th)"""
+        res = self.client().post('/search', json={"searchTerm": "", "page": 1, "per_page": 5})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(len(data['questions']), 5)
+        self.assertEqual(data['total_questions'], len(Question.query.all()))
+
+    # POST '/search' endpoint (200) (index invalidated while in use)
+    def test_200_for_post_question_search_index_invalidated(self):
+        """POST '/search' endpoint (200) (index invalidated while in use)"""
+        with self.invalidated_after_load(trigram_index):
+            res = self.client().post('/search', json={"searchTerm": "afraid"})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertIn("Why was 6 afraid of 7?", [question["question"] for question in data["questions"]])
+
     # POST '/search' endpoint (400)
     def test_400_for_post_question_search(self):
         """POST '/search' endpoint (400)"""
@@ -224,6 +521,46 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "Method not allowed")
 
+    # GET '/search/suggest' endpoint (200)
+    def test_200_for_get_search_suggestions(self):
+        """GET '/search/suggest' endpoint (200)"""
+        res = self.client().get('/search/suggest?q=why was 6 af')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertIn("Why was 6 afraid of 7?", [question["question"] for question in data["questions"]])
+        self.assertEqual(data["terms"], ["afraid", "africa"])
+
+    # GET '/search/suggest' endpoint (200) (prefix ending in a space)
+    def test_200_for_get_search_suggestions_trailing_space(self):
+        """GET '/search/suggest' endpoint (200) (prefix ending in a space)"""
+        res = self.client().get('/search/suggest?q=why was ')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertIn("Why was 6 afraid of 7?", [question["question"] for question in data["questions"]])
+        self.assertEqual(data["terms"], [])
+
+    # GET '/search/suggest' endpoint (200) (index invalidated while in use)
+    def test_200_for_get_search_suggestions_index_invalidated(self):
+        """GET '/search/suggest' endpoint (200) (index invalidated while in use)"""
+        with self.invalidated_after_load(prefix_index):
+            res = self.client().get('/search/suggest?q=why was 6 af')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["terms"], ["afraid", "africa"])
+
+    # GET '/search/suggest' endpoint (400)
+    def test_400_for_get_search_suggestions(self):
+        """GET '/search/suggest' endpoint (400)"""
+        res = self.client().get('/search/suggest?q=')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["400_BAD_REQUEST"])
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "Bad request")
+
     # GET '/categories/<int:category_id>/questions' endpoint (200)
     def test_200_for_get_questions_by_category(self):
         """GET '/categories/<int:category_id>/questions' endpoint (200)"""
@@ -233,6 +570,27 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, CODE["200_OK"])
         self.assertEqual(data["success"], True)
 
+    # GET '/categories/<int:category_id>/questions' endpoint (200) (streamed)
+    def test_200_for_get_questions_by_category_streamed(self):
+        """GET '/categories/<int:category_id>/questions' endpoint (200) (streamed)"""
+        buffered = json.loads(self.client().get("/categories/1/questions").data)
+        res = self.client().get("/categories/1/questions?stream=true")
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["questions"], buffered["questions"])
+        self.assertEqual(data["total_questions"], buffered["total_questions"])
+
+    # POST '/search' endpoint (200) (streamed)
+    def test_200_for_post_question_search_streamed(self):
+        """POST '/search' endpoint (200) (streamed)"""
+        res = self.client().post('/search', json={"searchTerm": "", "stream": True})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["success"], True)
+        self.assertEqual(len(data["questions"]), len(Question.query.all()))
+
     # GET '/categories/<int:category_id>/questions' endpoint (404)
     def test_404_for_get_question_by_category_id(self):
         """GET '/categories/<int:category_id>/questions' endpoint (404)"""
@@ -273,6 +631,88 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, CODE["200_OK"])
         self.assertEqual(data["success"], True)
 
+    # POST '/quizzes' endpoint (200) (pool invalidated while in use)
+    def test_200_for_post_quiz_question_pool_invalidated(self):
+        """POST '/quizzes' endpoint (200) (pool invalidated while in use)"""
+        with self.invalidated_after_load(quiz_question_pool):
+            res = self.client().post('/quizzes', json={"previous_questions": [],
+                                                       "quiz_category": {"type": "Science", "id": 1}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["question"]["category"], 1)
+
+    #  Helper function to have another thread invalidate `index` right after each of its loads, as a write
+    #  made by another request (or another worker) would.
+    @contextmanager
+    def invalidated_after_load(self, index):
+        load, threads = index._load, []
+
+        def load_then_invalidate():
+            load()
+            thread = threading.Thread(target=index.invalidate)
+            thread.start()
+            # Blocks while the index is held: the invalidation then lands after this use of it
+            thread.join(0.1)
+            threads.append(thread)
+
+        index._load = load_then_invalidate
+
+        try:
+            yield
+        finally:
+            del index._load
+
+            for thread in threads:
+                thread.join()
+
+    # POST '/quizzes' endpoint (200) (category and previous questions)
+    def test_200_for_post_quiz_question_unseen_in_category(self):
+        """POST '/quizzes' endpoint (200) (category and previous questions)"""
+        category_question_ids = [question.id for question in Question.query.filter(Question.category == 1).all()]
+        res = self.client().post('/quizzes', json={"previous_questions": category_question_ids[1:],
+                                                   "quiz_category": {"type": "Science", "id": 1}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["quiz_exhausted"], False)
+        self.assertEqual(data["question"]["id"], category_question_ids[0])
+
+    # POST '/quizzes' endpoint (200) (quiz exhausted)
+    def test_200_for_post_quiz_question_exhausted(self):
+        """POST '/quizzes' endpoint (200) (quiz exhausted)"""
+        category_question_ids = [question.id for question in Question.query.filter(Question.category == 1).all()]
+        res = self.client().post('/quizzes', json={"previous_questions": category_question_ids,
+                                                   "quiz_category": {"type": "Science", "id": 1}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["quiz_exhausted"], True)
+        self.assertEqual(data["question"], None)
+
+    # POST '/quizzes' endpoint (200) (target difficulty)
+    def test_200_for_post_quiz_question_with_difficulty(self):
+        """POST '/quizzes' endpoint (200) (target difficulty)"""
+        res = self.client().post('/quizzes', json={"previous_questions": [], "difficulty": 1,
+                                                   "quiz_category": {"type": "All", "id": 0}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["difficulty"], 1)
+        self.assertEqual(data["question"]["difficulty"], 1)
+
+    # POST '/quizzes' endpoint (200) (adaptive difficulty)
+    def test_200_for_post_quiz_question_adaptive(self):
+        """POST '/quizzes' endpoint (200) (adaptive difficulty)"""
+        res = self.client().post('/quizzes', json={"previous_questions": [], "adaptive": True, "difficulty": 2,
+                                                   "recent_results": [True, True, True],
+                                                   "quiz_category": {"type": "All", "id": 0}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["difficulty"], 3)
+        self.assertEqual(data["quiz_exhausted"], False)
+
     # POST '/quizzes' endpoint (400)
     def test_400_for_post_quiz_question(self):
         """POST '/quizzes' endpoint (400)"""
@@ -283,6 +723,422 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "Bad request")
 
+    # POST '/quizzes' endpoint (400) (body missing or not an object)
+    def test_400_for_post_quiz_question_without_body(self):
+        """POST '/quizzes' endpoint (400) (body missing or not an object)"""
+        for res in (self.client().post('/quizzes'), self.client().post('/quizzes', json=[1, 2])):
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, CODE["400_BAD_REQUEST"])
+            self.assertEqual(data["success"], False)
+            self.assertEqual(data["message"], "Bad request")
+
+    # POST '/search' endpoint (429) (rate limited)
+    def test_429_for_post_question_search_rate_limited(self):
+        """POST '/search' endpoint (429) (rate limited)"""
+        app = create_app({"RATE_LIMIT_BURST": 2, "RATE_LIMIT_PER_SECOND": 0.01})
+        setup_db(app, self.database_path)
+        client = app.test_client()
+
+        statuses = [client.post('/search', json={"searchTerm": "afraid"}).status_code for _ in range(3)]
+        res = client.post('/search', json={"searchTerm": "afraid"})
+        data = json.loads(res.data)
+
+        self.assertEqual(statuses[:2], [CODE["200_OK"], CODE["200_OK"]])
+        self.assertEqual(res.status_code, CODE["429_TOO_MANY_REQUESTS"])
+        self.assertEqual(data["message"], "Too many requests")
+        self.assertIn("Retry-After", res.headers)
+
+    # POST '/search' endpoint (429) (rate limited per client behind a proxy)
+    def test_429_for_post_question_search_rate_limited_behind_proxy(self):
+        """POST '/search' endpoint (429) (rate limited per client behind a proxy)"""
+        app = create_app({"RATE_LIMIT_BURST": 1, "RATE_LIMIT_PER_SECOND": 0.01, "PROXY_FIX_X_FOR": 1})
+        setup_db(app, self.database_path)
+        client = app.test_client()
+
+        # Every request comes from the proxy's address; each player has a bucket of their own
+        statuses = [client.post('/search', json={"searchTerm": "afraid"},
+                                headers={"X-Forwarded-For": player}).status_code
+                    for player in ("203.0.113.1", "203.0.113.2", "203.0.113.1")]
+
+        self.assertEqual(statuses, [CODE["200_OK"], CODE["200_OK"], CODE["429_TOO_MANY_REQUESTS"]])
+
+    # POST '/quizzes' endpoint (429) (server at capacity)
+    def test_429_for_post_quiz_question_load_shed(self):
+        """POST '/quizzes' endpoint (429) (server at capacity)"""
+        app = create_app({"MAX_CONCURRENT_REQUESTS": 0})
+        setup_db(app, self.database_path)
+        client = app.test_client()
+        res = client.post('/quizzes', json={"previous_questions": [], "quiz_category": {"type": "All", "id": 0}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["429_TOO_MANY_REQUESTS"])
+        self.assertEqual(data["success"], False)
+
+    # POST '/quizzes/sessions' endpoints (200)
+    def test_200_for_quiz_session(self):
+        """POST '/quizzes/sessions' endpoints (200)"""
+        res = self.client().post('/quizzes/sessions', json={"quiz_category": {"type": "Science", "id": 1}})
+        session = json.loads(res.data)
+
+        asked_question_ids = []
+        for _ in range(session["total_questions"]):
+            data = json.loads(self.client().post('/quizzes/sessions/{}/next'.format(session["session_id"])).data)
+            if data["question"] is not None:
+                asked_question_ids.append(data["question"]["id"])
+
+        data = json.loads(self.client().post('/quizzes/sessions/{}/next'.format(session["session_id"])).data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(len(asked_question_ids), len(set(asked_question_ids)))
+        self.assertEqual(data["quiz_exhausted"], True)
+        self.assertEqual(data["question"], None)
+
+    # DELETE '/quizzes/sessions/<session_id>' endpoint (200)
+    def test_200_for_end_quiz_session(self):
+        """DELETE '/quizzes/sessions/<session_id>' endpoint (200)"""
+        session = json.loads(self.client().post('/quizzes/sessions', json={"quiz_category": {"id": 0}}).data)
+        res = self.client().delete('/quizzes/sessions/{}'.format(session["session_id"]))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["success"], True)
+
+    # POST '/quizzes/sessions/<session_id>/next' endpoint (404)
+    def test_404_for_next_quiz_session_question(self):
+        """POST '/quizzes/sessions/<session_id>/next' endpoint (404)"""
+        res = self.client().post('/quizzes/sessions/unknown/next')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["404_RESOURCE_NOT_FOUND"])
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "Resource not found")
+
+    # Redis quiz session store (exhausted sessions keep their TTL)
+    def test_redis_quiz_session_store(self):
+        """Redis quiz session store (exhausted sessions keep their TTL)"""
+        store = self.make_redis_session_store()
+        store.create("exhausted", [3, 7])
+
+        popped = [store.pop("exhausted") for _ in range(4)]
+        ttl = store._client.ttl(store.prefix + "exhausted")
+
+        self.assertEqual(popped, [7, 3, None, None])
+        self.assertEqual(store.remaining("exhausted"), 0)
+        self.assertTrue(0 < ttl <= 60)
+        with self.assertRaises(KeyError):
+            store.pop("unknown")
+
+        store.delete("exhausted")
+
+    #  Helper function to build a Redis session store on TEST_REDIS_URL, or on fakeredis when it is installed.
+    def make_redis_session_store(self):
+        url = os.getenv("TEST_REDIS_URL")
+
+        if url:
+            return RedisSessionStore(url, ttl=60, prefix="trivia:test:quiz:")
+
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest("set TEST_REDIS_URL or install 'fakeredis' to test the Redis session store")
+
+        return RedisSessionStore(None, ttl=60, prefix="trivia:test:quiz:", client=fakeredis.FakeRedis())
+
+    # GET '/status/db-pool' endpoint (200)
+    def test_200_for_get_db_pool_status(self):
+        """GET '/status/db-pool' endpoint (200)"""
+        if db.engine.dialect.name != "postgresql":
+            self.skipTest("the instrumented connection pool is only used on Postgres")
+
+        self.client().get('/questions')
+        res = self.client().get('/status/db-pool')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["success"], True)
+        self.assertTrue(data["pool"]["checkouts"] >= 1)
+        self.assertTrue(data["pool"]["wait_seconds_max"] >= 0)
+
+    # Instrumented connection pool (checkouts, checkins and waits, on a temporary SQLite file)
+    def test_instrumented_connection_pool(self):
+        """Instrumented connection pool (checkouts, checkins and waits, on a temporary SQLite file)"""
+        database_file, database_path = tempfile.mkstemp(suffix=".db")
+        os.close(database_file)
+
+        # A slow connect, so time spent opening a connection would show up if it were counted as waiting
+        def connect():
+            time.sleep(0.2)
+            return sqlite3.connect(database_path)
+
+        engine = create_engine("sqlite://", creator=connect, poolclass=InstrumentedQueuePool, pool_size=1,
+                               max_overflow=0)
+        pool_metrics.reset()
+
+        try:
+            for _ in range(3):
+                with engine.connect() as connection:
+                    connection.execute("SELECT 1")
+
+            metrics = pool_metrics.snapshot(engine.pool)
+        finally:
+            engine.dispose()
+            pool_metrics.reset()
+            os.remove(database_path)
+
+        self.assertEqual(metrics["checkouts"], 3)
+        self.assertEqual(metrics["checkins"], 3)
+        self.assertEqual(metrics["checked_out"], 0)
+        self.assertEqual(metrics["connects"], 1)
+        self.assertTrue(metrics["connect_seconds_total"] >= 0.2)
+        self.assertTrue(metrics["wait_seconds_max"] < 0.1)
+
+    # GET '/questions' and '/categories/<id>/questions' endpoints (200) (in-memory question store)
+    def test_200_for_get_questions_from_question_store(self):
+        """GET '/questions' and '/categories/<id>/questions' endpoints (200) (in-memory question store)"""
+        app = create_app({"QUESTION_STORE_ENABLED": True, "RESPONSE_CACHE_ENABLED": False})
+        setup_db(app, self.database_path)
+        client = app.test_client()
+
+        for path in ('/questions?page=1', '/questions?after_id=1', '/categories/1/questions'):
+            res = client.get(path)
+
+            self.assertEqual(res.status_code, CODE["200_OK"])
+            self.assertEqual(json.loads(res.data), json.loads(self.client().get(path).data))
+
+    # GET '/questions' endpoint (200) (pre-encoded JSON fragments)
+    def test_200_for_get_questions_from_json_fragments(self):
+        """GET '/questions' endpoint (200) (pre-encoded JSON fragments)"""
+        app = create_app({"JSON_FRAGMENT_CACHE_ENABLED": False, "RESPONSE_CACHE_ENABLED": False})
+        setup_db(app, self.database_path)
+        fragment_app = create_app({"RESPONSE_CACHE_ENABLED": False})
+        setup_db(fragment_app, self.database_path)
+
+        question = Question.query.order_by(Question.id).first()
+        fragment_app.test_client().get('/questions')
+        question.answer = question.answer + " (edited)"
+        question.update()
+
+        res = fragment_app.test_client().get('/questions')
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(res.data, app.test_client().get('/questions').data)
+        self.assertEqual(json.loads(res.data)["questions"][0]["answer"], question.answer)
+
+    # GET '/questions' endpoint (200) (gzip, precompressed in the response cache)
+    def test_200_for_get_questions_gzip(self):
+        """GET '/questions' endpoint (200) (gzip, precompressed in the response cache)"""
+        plain = self.client().get('/questions?per_page=50')
+        res = self.client().get('/questions?per_page=50', headers={"Accept-Encoding": "gzip"})
+        cached = self.client().get('/questions?per_page=50', headers={"Accept-Encoding": "gzip",
+                                                                      "If-None-Match": res.headers["ETag"]})
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(res.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", res.headers["Vary"])
+        self.assertEqual(gzip.decompress(res.data), plain.data)
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertNotEqual(res.headers["ETag"], plain.headers["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+    # POST '/search' endpoint (200) (streamed and gzip-compressed)
+    def test_200_for_post_question_search_stream_gzip(self):
+        """POST '/search' endpoint (200) (streamed and gzip-compressed)"""
+        res = self.client().post('/search', json={"searchTerm": "", "stream": True},
+                                 headers={"Accept-Encoding": "gzip"})
+        data = json.loads(gzip.decompress(res.data))
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(res.headers["Content-Encoding"], "gzip")
+        self.assertEqual(data["total_questions"], Question.query.count())
+
+    # GET '/categories' endpoint (200) (MessagePack)
+    def test_200_for_get_categories_msgpack(self):
+        """GET '/categories' endpoint (200) (MessagePack)"""
+        if msgpack is None:
+            self.skipTest("MessagePack responses need the optional 'msgpack' package")
+
+        res = self.client().get('/categories', headers={"Accept": "application/msgpack"})
+        data = msgpack.unpackb(res.data, raw=False)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(res.mimetype, "application/msgpack")
+        self.assertEqual(data, json.loads(self.client().get('/categories').data))
+
+    # GET '/questions' endpoint (200) (write made by another worker process)
+    def test_200_for_get_questions_after_write_by_other_process(self):
+        """GET '/questions' endpoint (200) (write made by another worker process)"""
+        app = create_app({"SHARED_VERSION_POLL_INTERVAL": 0})
+        setup_db(app, self.database_path)
+        client = app.test_client()
+        before = json.loads(client.get('/questions').data)
+
+        # Another process's write fires no events here: only the shared version it bumped tells this one
+        db.session.execute(Question.__table__.insert(), {"question": "Written elsewhere?", "answer": "Yes",
+                                                         "category": 1, "difficulty": 1})
+        db.session.execute("UPDATE data_versions SET version = version + 1")
+        db.session.commit()
+
+        res = client.get('/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["total_questions"], before["total_questions"] + 1)
+
+    # Shared data version (database without migrations/005_data_versions.sql)
+    def test_shared_version_without_data_versions(self):
+        """Shared data version (database without migrations/005_data_versions.sql)"""
+        db.session.execute("DROP TABLE data_versions")
+        shared_version_poller._enabled = None
+        # setUp's write already bumped the version in this (never committed) transaction
+        db.session.info.pop("shared_version", None)
+
+        try:
+            # Writes go on without the table: sharing is switched off instead
+            Question(question="Which migration is missing?", answer="005", category=1, difficulty=1).insert()
+
+            self.assertEqual(shared_version_poller._enabled, False)
+            self.assertEqual(shared_version_poller.poll(0), False)
+            self.assertTrue(Question.query.filter(Question.answer == "005").count())
+        finally:
+            # The table comes back with the test's rollback
+            shared_version_poller._enabled = None
+
+    # GET '/status/startup' endpoint (200)
+    def test_200_for_get_startup_status(self):
+        """GET '/status/startup' endpoint (200)"""
+        res = self.client().get('/status/startup')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertEqual(data["success"], True)
+        self.assertGreater(data["startup"]["create_app_ms"], 0)
+
+    # GET '/categories/<id>/questions' endpoint (200) (read replica, then read-your-writes)
+    def test_200_for_get_questions_from_read_replica(self):
+        """GET '/categories/<id>/questions' endpoint (200) (read replica, then read-your-writes)"""
+        replica_file, replica_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(replica_file)
+        app = create_app({"RESPONSE_CACHE_ENABLED": False, "QUESTION_STORE_ENABLED": False})
+        setup_db(app, self.database_path, "sqlite:///" + replica_path)
+
+        try:
+            # The replica holds a single question the primary does not have
+            with app.app_context():
+                replica_engine = db.get_engine(app, bind=REPLICA_BIND)
+                db.metadata.create_all(replica_engine)
+                replica_engine.execute(Category.__table__.insert(), {"id": 1, "type": "Science"})
+                replica_engine.execute(Question.__table__.insert(), {"question": "Replica only?", "answer": "Yes",
+                                                                     "category": 1, "difficulty": 1})
+            client = app.test_client()
+
+            replica_data = json.loads(client.get('/categories/1/questions').data)
+            client.post('/questions', json={"question": "Written to the primary?", "answer": "Yes", "category": 1,
+                                            "difficulty": 1})
+            primary_data = json.loads(client.get('/categories/1/questions').data)
+
+            self.assertEqual([question["question"] for question in replica_data["questions"]], ["Replica only?"])
+            self.assertIn("Written to the primary?", [question["question"] for question in primary_data["questions"]])
+            self.assertEqual(Question.query.filter(Question.question == "Replica only?").count(), 0)
+        finally:
+            with app.app_context():
+                db.get_engine(app, bind=REPLICA_BIND).dispose()
+            os.remove(replica_path)
+
+    # Background job queue (retried until it succeeds, persisted until done)
+    def test_background_job_retried_and_persisted(self):
+        """Background job queue (retried until it succeeds, persisted until done)"""
+        app, jobs_path = self.make_jobs_app()
+        queue, calls, done = JobQueue(), [], threading.Event()
+
+        @queue.job("flaky")
+        def flaky(value):
+            calls.append(value)
+
+            if len(calls) < 2:
+                raise RuntimeError("try again")
+            done.set()
+
+        try:
+            queue.retry_delay = 0.01
+            queue.init_app(app)
+            queue.enqueue("flaky", {"value": 1})
+
+            self.assertTrue(done.wait(5))
+            queue.join()
+            with app.app_context():
+                self.assertEqual(db.get_engine(app).execute("SELECT COUNT(*) FROM jobs").scalar(), 0)
+            self.assertEqual(calls, [1, 1])
+        finally:
+            self.remove_jobs_app(app, jobs_path)
+
+    # Background job queue (jobs left by a stopped process are picked up)
+    def test_background_job_recovered(self):
+        """Background job queue (jobs left by a stopped process are picked up)"""
+        app, jobs_path = self.make_jobs_app()
+        queue, done = JobQueue(), threading.Event()
+        queue.job("left_over")(lambda: done.set())
+
+        try:
+            with app.app_context():
+                db.get_engine(app).execute(Job.__table__.insert(), {"name": "left_over", "payload": "{}",
+                                                                    "created_at": datetime.utcnow(),
+                                                                    "claimed_at": datetime.utcnow() - timedelta(hours=1)})
+
+            queue.init_app(app)
+
+            self.assertTrue(done.wait(5))
+            queue.join()
+            with app.app_context():
+                self.assertEqual(db.get_engine(app).execute("SELECT COUNT(*) FROM jobs").scalar(), 0)
+        finally:
+            self.remove_jobs_app(app, jobs_path)
+
+    #  Helper function to create an app with background workers and persisted jobs on its own SQLite file.
+    @staticmethod
+    def make_jobs_app():
+        jobs_file, jobs_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(jobs_file)
+        app = create_app()
+        setup_db(app, "sqlite:///" + jobs_path)
+        app.config.update(JOB_QUEUE_WORKERS=1, JOB_QUEUE_PERSISTENT=True)
+
+        with app.app_context():
+            db.create_all()
+
+        return app, jobs_path
+
+    @staticmethod
+    def remove_jobs_app(app, jobs_path):
+        with app.app_context():
+            db.get_engine(app).dispose()
+        os.remove(jobs_path)
+
+    # GET '/metrics' endpoint (200) (instrumentation enabled)
+    def test_200_for_get_metrics(self):
+        """GET '/metrics' endpoint (200) (instrumentation enabled)"""
+        app = create_app({"INSTRUMENTATION_ENABLED": True})
+        setup_db(app, self.database_path)
+        client = app.test_client()
+
+        questions_res = client.get('/questions')
+        res = client.get('/metrics')
+        metrics = res.data.decode("utf-8")
+
+        self.assertEqual(res.status_code, CODE["200_OK"])
+        self.assertIn("Server-Timing", questions_res.headers)
+        self.assertIn('trivia_request_duration_seconds_count{route="/questions",method="GET"} 1', metrics)
+        self.assertIn('trivia_request_sql_queries_total{route="/questions",method="GET"}', metrics)
+
+    # GET '/metrics' endpoint (404) (instrumentation disabled)
+    def test_404_for_get_metrics(self):
+        """GET '/metrics' endpoint (404) (instrumentation disabled)"""
+        res = self.client().get('/metrics')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, CODE["404_RESOURCE_NOT_FOUND"])
+        self.assertEqual(data["success"], False)
+
     # GET '/quizzes' endpoint (405)
     def test_405_for_get_quiz(self):
         """GET '/quizzes' endpoint (405)"""
@@ -0,0 +1,159 @@
+import os
+import re
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+
+from .bulk import invalidate_derived_question_data
+from .models import db, Question, Category
+from .shared_version import drop_local_caches
+
+TEST_DATABASE_URL = "sqlite://"
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "trivia.psql")
+
+
+#  Helper function to pick the test database: TEST_DATABASE_URL (default in-memory SQLite), with the
+#  pytest-xdist worker id appended to the database name so parallel workers never share one.
+def database_url_for_tests(url=None):
+    url = make_url(url or os.getenv("TEST_DATABASE_URL", TEST_DATABASE_URL))
+    worker = os.getenv("PYTEST_XDIST_WORKER")
+
+    if worker and url.database not in (None, "", ":memory:"):
+        url.database = "{}_{}".format(url.database, worker)
+
+        if url.get_backend_name() == "postgresql":
+            _create_postgres_database(url)
+
+    return str(url)
+
+
+#  Helper function to create a disposable Postgres database if it does not exist yet.
+def _create_postgres_database(url):
+    maintenance_url = make_url(str(url))
+    maintenance_url.database = "postgres"
+    engine = create_engine(maintenance_url, isolation_level="AUTOCOMMIT")
+
+    try:
+        with engine.connect() as connection:
+            exists = connection.execute("SELECT 1 FROM pg_database WHERE datname = %s", url.database).scalar()
+
+            if not exists:
+                connection.execute('CREATE DATABASE "{}"'.format(url.database))
+    finally:
+        engine.dispose()
+
+
+#  Helper function to read the rows of every COPY block of a pg_dump file as {table: [row dicts]}.
+def read_copy_rows(path=FIXTURES_PATH):
+    tables, table, columns = {}, None, None
+
+    with open(path, encoding="utf-8") as dump:
+        for line in dump:
+            line = line.rstrip("\n")
+
+            if table is None:
+                match = re.match(r"COPY public\.(\w+) \(([^)]*)\) FROM stdin;$", line)
+
+                if match:
+                    table, columns = match.group(1), [column.strip() for column in match.group(2).split(",")]
+                    tables[table] = []
+            elif line == "\\.":
+                table = None
+            else:
+                values = [None if value == "\\N" else _unescape_copy_value(value) for value in line.split("\t")]
+                tables[table].append(dict(zip(columns, values)))
+
+    return tables
+
+
+def _unescape_copy_value(value):
+    return re.sub(r"\\(.)", lambda match: {"t": "\t", "n": "\n", "r": "\r"}.get(match.group(1), match.group(1)),
+                  value)
+
+
+#  Helper function to (re)create the schema and load the categories and questions of trivia.psql.
+def load_fixtures(path=FIXTURES_PATH):
+    db.drop_all()
+    db.create_all()
+
+    rows = read_copy_rows(path)
+
+    for model in (Category, Question):
+        table = model.__table__
+        table_rows = [{column: table.c[column].type.python_type(value) if value is not None else None
+                       for column, value in row.items()} for row in rows.get(table.name, ())]
+
+        if table_rows:
+            db.session.execute(table.insert(), table_rows)
+
+        # Rows were loaded with explicit ids: move Postgres sequences past them
+        if db.engine.dialect.name == "postgresql":
+            db.session.execute("SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                               "COALESCE((SELECT MAX(id) FROM {0}), 1))".format(table.name))
+
+    db.session.commit()
+    invalidate_derived_question_data()
+
+
+#  Helper function to make pysqlite honour SAVEPOINT (it otherwise manages transactions itself).
+#  See "Serializable isolation / Savepoints / Transactional DDL" in the SQLAlchemy SQLite docs.
+def enable_sqlite_savepoints():
+    if event.contains(Engine, "begin", _begin_sqlite_transaction):
+        return
+
+    event.listen(Engine, "connect", _disable_pysqlite_transactions)
+    event.listen(Engine, "begin", _begin_sqlite_transaction)
+
+
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    if type(dbapi_connection).__module__.startswith("sqlite3"):
+        dbapi_connection.isolation_level = None
+
+
+def _begin_sqlite_transaction(connection):
+    if connection.dialect.name == "sqlite":
+        connection.execute("BEGIN")
+
+
+'''
+RolledBackTransaction
+    runs one test inside a database transaction that is rolled back afterwards.
+    db.session is swapped for a session bound to that transaction; commits made
+    by the code under test only release a SAVEPOINT, which is reopened straight
+    away, so nothing a test writes outlives it.
+'''
+
+
+class RolledBackTransaction:
+
+    def __init__(self, app):
+        self.app = app
+        self.connection = None
+        self.transaction = None
+        self.previous_session = None
+
+    def start(self):
+        self.connection = db.get_engine(self.app).connect()
+        self.transaction = self.connection.begin()
+
+        session = db.create_scoped_session(options={"bind": self.connection, "binds": {}})
+        # Flask-SQLAlchemy removes the session after every request; keep it (and its SAVEPOINT) for the test
+        session.remove = lambda: None
+        session.begin_nested()
+        event.listen(session(), "after_transaction_end", _restart_savepoint)
+
+        self.previous_session, db.session = db.session, session
+
+    def rollback(self):
+        db.session.close()
+        db.session = self.previous_session
+        self.transaction.rollback()
+        self.connection.close()
+        drop_local_caches()
+
+
+def _restart_savepoint(session, transaction):
+    if transaction.nested and not transaction._parent.nested:
+        session.expire_all()
+        session.begin_nested()
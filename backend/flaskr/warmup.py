@@ -0,0 +1,71 @@
+import sys
+from threading import Thread
+from time import perf_counter
+
+from .category_registry import category_registry
+from .models import db
+from .pagination import question_count
+from .quiz import quiz_question_pool
+from .search import trigram_index, use_database_search
+
+
+'''
+StartupTimes
+    cold-start timings of this process in seconds: module imports, create_app
+    and the background cache warm-up (None until it has finished).
+'''
+
+
+class StartupTimes:
+
+    def __init__(self):
+        self.imports = None
+        self.create_app = None
+        self.warmup = None
+
+    def format(self):
+        return {
+            name: round(seconds * 1000, 1) if seconds is not None else None
+            for name, seconds in (("imports_ms", self.imports), ("create_app_ms", self.create_app),
+                                  ("warmup_ms", self.warmup))
+        }
+
+
+startup_times = StartupTimes()
+
+
+#  Helper function to load the in-process caches that would otherwise be built by the first requests.
+def load_caches(search_backend, question_store=None):
+    category_registry.types_by_id()
+    question_count.get()
+    quiz_question_pool.size()
+
+    if not use_database_search(search_backend):
+        trigram_index.search("warm")
+    if question_store is not None:
+        question_store.snapshot()
+
+
+#  Helper function to time a warm-up of the caches in the app context.
+def _warm_caches(app, question_store):
+    started = perf_counter()
+
+    with app.app_context():
+        try:
+            load_caches(app.config["SEARCH_BACKEND"], question_store)
+        except:
+            # Warm-up is best effort: the caches still load lazily on first use
+            print(sys.exc_info())
+        finally:
+            db.session.remove()
+
+    startup_times.warmup = perf_counter() - started
+    app.logger.info("Warmed caches in %.1f ms", startup_times.warmup * 1000)
+
+
+#  Helper function to warm the caches on a daemon thread so the app can take requests straight away.
+def warm_caches_in_background(app, question_store=None):
+    thread = Thread(target=_warm_caches, args=(app, question_store), name="cache-warmup", daemon=True)
+    thread.start()
+
+    return thread
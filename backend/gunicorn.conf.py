@@ -0,0 +1,42 @@
+"""Gunicorn settings for serving the API with many cooperative (gevent) workers.
+
+Each worker runs every request in a greenlet, so a handler waiting on Postgres yields to the
+others instead of pinning an OS thread; thousands of concurrent quiz players share a handful of
+processes. Every setting can be overridden through the environment.
+
+Quiz sessions are shared between workers only through Redis, so without QUIZ_SESSION_STORE=redis a
+single worker is started (and more are refused), and it is never recycled: restarting it would end
+every quiz in progress. The other in-process caches follow writes made by
+other workers through the shared data version (see flaskr/shared_version.py).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+quiz_session_store = os.getenv("QUIZ_SESSION_STORE", "memory")
+# In-memory quiz sessions live in the worker that created them: several workers need QUIZ_SESSION_STORE=redis
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1 if quiz_session_store == "redis" else 1))
+
+if workers > 1 and quiz_session_store == "memory":
+    raise RuntimeError("WEB_CONCURRENCY={} needs QUIZ_SESSION_STORE=redis: in-memory quiz sessions are not shared "
+                       "between worker processes".format(workers))
+worker_class = os.getenv("WORKER_CLASS", "gevent")
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", 1000))
+timeout = int(os.getenv("WORKER_TIMEOUT", 30))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+# Recycling a worker drops the quiz sessions held in its memory: only on by default with Redis
+max_requests = int(os.getenv("MAX_REQUESTS", 10000 if quiz_session_store == "redis" else 0))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 1000))
+
+if max_requests > 0 and quiz_session_store == "memory":
+    raise RuntimeError("MAX_REQUESTS={} needs QUIZ_SESSION_STORE=redis: recycling a worker would end the in-memory "
+                       "quiz sessions in progress".format(max_requests))
+accesslog = os.getenv("ACCESS_LOG", None)
+
+
+def post_fork(server, worker):
+    # psycopg2 blocks the whole process unless it is told to wait through gevent
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+
+        patch_psycopg()
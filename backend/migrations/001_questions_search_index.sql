@@ -0,0 +1,19 @@
+--
+-- Trigram indexes backing POST /search on Postgres.
+--
+-- pg_trgm GIN indexes let ILIKE '%term%' on question and answer text use an
+-- index scan instead of a sequential scan of the questions table.
+--
+-- Apply with:
+--     psql trivia < migrations/001_questions_search_index.sql
+--
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS questions_question_trgm_idx
+    ON public.questions USING gin (question gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS questions_answer_trgm_idx
+    ON public.questions USING gin (answer gin_trgm_ops);
+
+ANALYZE public.questions;
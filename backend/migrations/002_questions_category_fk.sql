@@ -0,0 +1,47 @@
+--
+-- Typed, indexed category column on questions.
+--
+-- Brings both kinds of existing databases in line with models.Question:
+--   * restored from trivia.psql: category is already an integer with a foreign key;
+--     only the composite index is missing
+--   * created by db.create_all() from older models: category is a varchar with no
+--     foreign key and no index
+--
+-- Apply with:
+--     psql trivia < migrations/002_questions_category_fk.sql
+--
+
+BEGIN;
+
+-- Cast in place; works whether the column is currently text or already integer
+ALTER TABLE public.questions
+    ALTER COLUMN category TYPE integer USING NULLIF(trim(category::text), '')::integer;
+
+-- Questions pointing at categories that do not exist cannot satisfy the foreign key
+UPDATE public.questions
+    SET category = NULL
+    WHERE category IS NOT NULL
+      AND category NOT IN (SELECT id FROM public.categories);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_catalog.pg_constraint
+        WHERE conrelid = 'public.questions'::regclass
+          AND contype = 'f'
+    ) THEN
+        ALTER TABLE ONLY public.questions
+            ADD CONSTRAINT category FOREIGN KEY (category) REFERENCES public.categories(id)
+            ON UPDATE CASCADE ON DELETE SET NULL;
+    END IF;
+END
+$$;
+
+-- Serves category browsing (leading column) and per-difficulty quiz selection
+CREATE INDEX IF NOT EXISTS questions_category_difficulty_idx
+    ON public.questions (category, difficulty);
+
+COMMIT;
+
+ANALYZE public.questions;
@@ -0,0 +1,28 @@
+--
+-- Per-(category, difficulty) question counts behind GET /categories/stats.
+--
+-- The app keeps the table current from its own question writes; this creates it
+-- and backfills it from the existing questions.
+--
+-- Apply with:
+--     psql trivia < migrations/003_category_stats.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.category_stats (
+    category integer NOT NULL REFERENCES public.categories(id) ON UPDATE CASCADE ON DELETE CASCADE,
+    difficulty integer NOT NULL,
+    question_count integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, difficulty)
+);
+
+DELETE FROM public.category_stats;
+
+INSERT INTO public.category_stats (category, difficulty, question_count)
+    SELECT category, difficulty, count(*)
+    FROM public.questions
+    WHERE category IS NOT NULL AND difficulty IS NOT NULL
+    GROUP BY category, difficulty;
+
+COMMIT;
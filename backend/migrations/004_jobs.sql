@@ -0,0 +1,23 @@
+--
+-- Background jobs kept across restarts when JOB_QUEUE_PERSISTENT=true.
+--
+-- The app adds a row for each job it queues and deletes it once the job has run;
+-- rows left by a stopped process are picked up again (see flaskr/jobs.py).
+--
+-- Apply with:
+--     psql trivia < migrations/004_jobs.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.jobs (
+    id serial PRIMARY KEY,
+    name character varying NOT NULL,
+    payload text NOT NULL DEFAULT '{}',
+    attempts integer NOT NULL DEFAULT 0,
+    last_error text,
+    claimed_at timestamp without time zone,
+    created_at timestamp without time zone NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+);
+
+COMMIT;
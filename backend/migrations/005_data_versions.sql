@@ -0,0 +1,18 @@
+--
+-- Shared data version polled by every worker process to find out that another
+-- process has written questions or categories (see flaskr/shared_version.py).
+--
+-- Apply with:
+--     psql trivia < migrations/005_data_versions.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.data_versions (
+    id integer PRIMARY KEY,
+    version integer NOT NULL DEFAULT 0
+);
+
+INSERT INTO public.data_versions (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,3 @@
+export FLASK_ENV=production
+export CACHE_WARMUP_ENABLED=${CACHE_WARMUP_ENABLED:-true}
+gunicorn -c gunicorn.conf.py wsgi:app
\ No newline at end of file
@@ -0,0 +1,4 @@
+"""Production entry point: `gunicorn -c gunicorn.conf.py wsgi:app` (see run_prod.sh)."""
+from flaskr import create_app
+
+app = create_app()